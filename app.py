@@ -4,8 +4,14 @@ from routes.index_routes import register_index_routes
 from routes.stock_routes import register_stock_routes
 from routes.stock2_routes import register_stock2_routes
 from routes.stock3_routes import register_stock3_routes
+from routes.api_routes import register_api_routes
+from routes.screen_routes import register_screen_routes
+from json_provider import FastJSONProvider
+from http_cache import init_http_cache
 
 app = Flask(__name__, static_folder='static')
+# jsonify 与模板 |tojson 使用更快的 JSON 编码器
+app.json = FastJSONProvider(app)
 
 # 创建templates目录
 os.makedirs('templates', exist_ok=True)
@@ -15,6 +21,18 @@ register_index_routes(app)
 register_stock_routes(app)
 register_stock2_routes(app)
 register_stock3_routes(app)
+register_api_routes(app)
+register_screen_routes(app)
+
+# 较大的 JSON/HTML 响应按 Accept-Encoding 压缩
+init_http_cache(app)
+
+# 路由按需导入 pandas 等依赖，启动本身很快；设置 STOCK_WARMUP=N 时在接受请求前预热：
+# 加载数据模块、解析表结构、编译模板并预取前 N 只股票（STOCK_WARMUP_CODES 可指定代码）
+if os.environ.get('STOCK_WARMUP'):
+    from startup import warmup
+    warmup(app, int(os.environ['STOCK_WARMUP'] or 0),
+           [c for c in os.environ.get('STOCK_WARMUP_CODES', '').split(',') if c] or None)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicator_registry import Context
+
+# 向量化回测：策略在整段K线上一次性给出进出场信号，持仓、成交、资金曲线、回撤与手续费/滑点
+# 全部用数组运算得到，没有逐K线的 Python 循环。
+# 同一只股票的多组参数按列堆成 (K线数 × 参数组数) 的矩阵一起回测，
+# 指标通过 indicator_registry.Context 在参数组之间共享（例如 MA20 只算一次）。
+# 约定：信号在当根K线收盘后产生，下一根K线开盘成交，因此不会用到未来数据。
+
+DEFAULT_FEE = 0.0003        # 单边佣金
+DEFAULT_SLIPPAGE = 0.0005   # 单边滑点（按成交金额比例）
+PERIODS_PER_YEAR = 252
+DEFAULT_CHUNK_SIZE = 20
+
+
+class Strategy(NamedTuple):
+    signals: Callable[..., Tuple[np.ndarray, np.ndarray]]   # (ctx, **参数) -> (进场, 出场) 布尔数组
+    defaults: Dict[str, Any]
+    valid: Callable[..., bool]                              # 参数组合是否有意义（如快线周期小于慢线）
+
+
+STRATEGIES: Dict[str, Strategy] = {}
+
+
+def strategy(name: str, defaults: Dict[str, Any], valid: Callable[..., bool] = lambda **_: True):
+    """注册策略的装饰器"""
+    def decorator(func):
+        STRATEGIES[name] = Strategy(func, defaults, valid)
+        return func
+    return decorator
+
+
+def _values(series: pd.Series) -> np.ndarray:
+    return series.to_numpy(dtype=np.float64)
+
+
+def _crossed_above(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    prev_a = np.concatenate(([np.nan], a[:-1]))
+    prev_b = np.concatenate(([np.nan], b[:-1]))
+    return (a > b) & (prev_a <= prev_b)
+
+
+@strategy('ma_cross', {'fast': 5, 'slow': 20}, valid=lambda fast, slow: fast < slow)
+def _ma_cross(ctx, fast, slow):
+    # 快线上穿慢线买入，下穿卖出
+    f = _values(ctx.indicator(f'MA{fast}'))
+    s = _values(ctx.indicator(f'MA{slow}'))
+    return _crossed_above(f, s), _crossed_above(s, f)
+
+
+@strategy('rsi', {'period': 14, 'low': 30, 'high': 70}, valid=lambda period, low, high: low < high)
+def _rsi_threshold(ctx, period, low, high):
+    # RSI 低于 low 买入，高于 high 卖出
+    rsi = _values(ctx.indicator(f'RSI{period}'))
+    return rsi < low, rsi > high
+
+
+@strategy('kdj_cross', {})
+def _kdj_cross(ctx):
+    # K 线上穿 D 线买入，下穿卖出
+    k = _values(ctx.indicator('KDJ_K'))
+    d = _values(ctx.indicator('KDJ_D'))
+    return _crossed_above(k, d), _crossed_above(d, k)
+
+
+def positions_from_signals(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """
+    由进出场信号得到每根K线收盘后的目标仓位（0 或 1），同时出现时以出场为准。
+    entries/exits 为 (n,) 或 (n, k) 的布尔数组
+    """
+    state = np.where(exits, 0.0, np.where(entries, 1.0, np.nan))
+    # 向前填充：没有信号的K线沿用上一个信号的状态
+    rows = np.arange(state.shape[0]).reshape((-1,) + (1,) * (state.ndim - 1))
+    last = np.maximum.accumulate(np.where(np.isnan(state), -1, rows), axis=0)
+    filled = np.take_along_axis(state, np.maximum(last, 0), axis=0)
+    filled[last < 0] = 0.0
+    return filled
+
+
+def backtest(data: pd.DataFrame, entries: np.ndarray, exits: np.ndarray,
+             fee: float = DEFAULT_FEE, slippage: float = DEFAULT_SLIPPAGE) -> Dict[str, np.ndarray]:
+    """
+    回测一只股票。entries/exits 为 (n,) 或 (n, k)，k 组参数一起计算。
+    :return: {'position', 'returns', 'equity', 'drawdown', 'trades'}，各为与信号同形状的数组；
+             position 为每根K线持有的仓位，trades 为当根K线开盘的成交量（+1 买入、-1 卖出）
+    """
+    open_ = pd.to_numeric(data['open']).to_numpy(dtype=np.float64)
+    close = pd.to_numeric(data['close']).to_numpy(dtype=np.float64)
+    if np.ndim(entries) == 2:
+        open_, close = open_[:, None], close[:, None]
+
+    target = positions_from_signals(entries, exits)
+    # 第 t 根K线持有的仓位是第 t-1 根收盘后的目标仓位，开盘时调仓
+    position = np.zeros_like(target)
+    position[1:] = target[:-1]
+    prev_position = np.zeros_like(position)
+    prev_position[1:] = position[:-1]
+    trades = position - prev_position
+
+    prev_close = np.empty_like(close)
+    prev_close[0] = open_[0]
+    prev_close[1:] = close[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gap = open_ / prev_close - 1          # 昨收到今开，由调仓前的仓位承担
+        intraday = close / open_ - 1          # 今开到今收，由调仓后的仓位承担
+    gap = np.nan_to_num(gap, nan=0.0, posinf=0.0, neginf=0.0)
+    intraday = np.nan_to_num(intraday, nan=0.0, posinf=0.0, neginf=0.0)
+    cost = np.abs(trades) * (fee + slippage)
+    returns = (1 + prev_position * gap) * (1 - cost) * (1 + position * intraday) - 1
+
+    equity = np.cumprod(1 + returns, axis=0)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+    return {'position': position, 'returns': returns, 'equity': equity,
+            'drawdown': drawdown, 'trades': trades}
+
+
+def _trade_returns(returns: np.ndarray, trades: np.ndarray) -> List[np.ndarray]:
+    # 每列中每笔交易（买入K线到卖出K线，含卖出当天的开盘跳空）的收益率
+    result = []
+    for r, t in zip(returns.T, trades.T):
+        buys = np.flatnonzero(t > 0)
+        if len(buys) == 0:
+            result.append(np.empty(0))
+            continue
+        sells = np.flatnonzero(t < 0)
+        # 每笔买入对应其后第一笔卖出；未平仓的交易算到最后一根K线
+        ends = np.append(sells, len(r) - 1)[np.searchsorted(sells, buys)] + 1
+        log_equity = np.concatenate(([0.0], np.cumsum(np.log1p(r))))
+        result.append(np.expm1(log_equity[ends] - log_equity[buys]))
+    return result
+
+
+def summarize(result: Dict[str, np.ndarray], periods_per_year: int = PERIODS_PER_YEAR) -> List[Dict[str, float]]:
+    """由 backtest 的结果计算每组参数的统计指标"""
+    returns = result['returns']
+    equity = result['equity']
+    trades = result['trades']
+    if returns.ndim == 1:
+        returns, equity, trades = returns[:, None], equity[:, None], trades[:, None]
+        drawdown = result['drawdown'][:, None]
+    else:
+        drawdown = result['drawdown']
+    n = len(returns)
+    final = equity[-1] if n else np.ones(returns.shape[1])
+    std = returns.std(axis=0) if n else np.zeros(returns.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, returns.mean(axis=0) / std * np.sqrt(periods_per_year), 0.0)
+        annual = final ** (periods_per_year / max(n, 1)) - 1
+    exposure = (result['position'].reshape(n, -1) > 0).mean(axis=0) if n else np.zeros(returns.shape[1])
+
+    stats = []
+    for i, per_trade in enumerate(_trade_returns(returns, trades)):
+        stats.append({
+            'total_return': float(final[i] - 1),
+            'annual_return': float(annual[i]),
+            'max_drawdown': float(drawdown[:, i].min()) if n else 0.0,
+            'sharpe': float(sharpe[i]),
+            'trades': int(len(per_trade)),
+            'win_rate': float((per_trade > 0).mean()) if len(per_trade) else 0.0,
+            'exposure': float(exposure[i]),
+        })
+    return stats
+
+
+def parameter_grid(name: str, grid: Optional[Dict[str, Sequence[Any]]] = None) -> List[Dict[str, Any]]:
+    """策略默认参数与 grid 中各取值的笛卡尔积，过滤掉无效组合"""
+    spec = STRATEGIES[name]
+    axes = {key: [value] for key, value in spec.defaults.items()}
+    for key, values in (grid or {}).items():
+        if key not in spec.defaults:
+            raise ValueError(f'策略 {name} 没有参数 {key}')
+        axes[key] = list(values)
+    keys = list(axes)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*axes.values())]
+    return [p for p in combos if spec.valid(**p)]
+
+
+def run_code(code: str, name: str, params_list: List[Dict[str, Any]], start=None, end=None,
+             fee: float = DEFAULT_FEE, slippage: float = DEFAULT_SLIPPAGE) -> List[Dict[str, Any]]:
+    """
+    对一只股票回测一组参数（全部参数组一次矩阵回测）。
+    :return: 每组参数一行 {'code', 'params', 统计指标...}；没有数据时返回空列表
+    """
+    from db_utils import read_stock_data
+
+    data = read_stock_data(code, start, end)
+    if data is None or data.empty or not params_list:
+        return []
+    spec = STRATEGIES[name]
+    ctx = Context(data)
+    signals = [spec.signals(ctx, **params) for params in params_list]
+    entries = np.column_stack([s[0] for s in signals])
+    exits = np.column_stack([s[1] for s in signals])
+    stats = summarize(backtest(data, entries, exits, fee, slippage))
+    return [dict(code=code, params=params, **s) for params, s in zip(params_list, stats)]
+
+
+def _run_chunk(codes: Sequence[str], name: str, params_list: List[Dict[str, Any]], options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = []
+    for code in codes:
+        try:
+            rows.extend(run_code(code, name, params_list, **options))
+        except Exception as e:  # 单只股票出错不影响整次扫描
+            print(f'{code} 回测失败: {e}', file=sys.stderr)
+    return rows
+
+
+def sweep(name: str, grid: Optional[Dict[str, Sequence[Any]]] = None, codes: Optional[Sequence[str]] = None,
+          workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, **options) -> List[Dict[str, Any]]:
+    """
+    参数扫描：全部（或指定）股票 × 参数网格，按股票分块交给进程池。
+    :param options: start/end/fee/slippage，传给 run_code
+    :return: 每只股票每组参数一行
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f'不支持的策略: {name}')
+    params_list = parameter_grid(name, grid)
+    if codes is None:
+        from db_utils import get_stock_list
+        codes = [s['code'] for s in get_stock_list()]
+    chunks = [list(codes[i:i + chunk_size]) for i in range(0, len(codes), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return [row for chunk in chunks for row in _run_chunk(chunk, name, params_list, options)]
+    rows = []
+    # 用 spawn 启动子进程，避免 fork 继承父进程已打开的 SQLite 连接
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(_run_chunk, chunk, name, params_list, options) for chunk in chunks]
+        for future in as_completed(futures):
+            rows.extend(future.result())
+    return rows
+
+
+def aggregate(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按参数组汇总扫描结果（各股票统计指标的平均值），按平均收益率从高到低排序"""
+    if not rows:
+        return []
+    frame = pd.DataFrame(rows)
+    frame['params'] = frame['params'].map(lambda p: json.dumps(p, sort_keys=True))
+    metrics = [c for c in frame.columns if c not in ('code', 'params')]
+    summary = frame.groupby('params')[metrics].mean()
+    summary['stocks'] = frame.groupby('params')['code'].count()
+    summary = summary.sort_values('total_return', ascending=False)
+    return [dict(params=json.loads(p), **{k: float(v) for k, v in row.items()})
+            for p, row in summary.iterrows()]
+
+
+def _parse_values(text: str) -> List[Any]:
+    values = []
+    for item in text.split(','):
+        number = float(item)
+        values.append(int(number) if number.is_integer() else number)
+    return values
+
+
+def _parse_assignments(items: List[str]) -> Dict[str, List[Any]]:
+    result = {}
+    for item in items:
+        key, _, text = item.partition('=')
+        if not text:
+            raise ValueError(f'参数格式应为 name=v1,v2,...: {item}')
+        result[key] = _parse_values(text)
+    return result
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='向量化回测与参数扫描')
+    parser.add_argument('strategy', choices=sorted(STRATEGIES), help='策略名')
+    parser.add_argument('codes', nargs='*', help='只回测这些股票代码（默认全部）')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help='参数取值，多个取值时做网格扫描，例如 --param fast=5,10 --param slow=20,60')
+    parser.add_argument('--start', help='开始日期')
+    parser.add_argument('--end', help='结束日期')
+    parser.add_argument('--fee', type=float, default=DEFAULT_FEE, help='单边佣金比例')
+    parser.add_argument('--slippage', type=float, default=DEFAULT_SLIPPAGE, help='单边滑点比例')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认 CPU 核数')
+    parser.add_argument('--top', type=int, default=10, help='输出平均收益最高的前 N 组参数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出汇总结果')
+    args = parser.parse_intermixed_args(argv)
+
+    started = time.perf_counter()
+    try:
+        rows = sweep(args.strategy, _parse_assignments(args.param), args.codes or None, workers=args.workers,
+                     start=args.start, end=args.end, fee=args.fee, slippage=args.slippage)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    summary = aggregate(rows)[:args.top]
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        for row in summary:
+            print(f"{json.dumps(row['params'])} 股票 {int(row['stocks'])} 收益 {row['total_return']:.2%} "
+                  f"年化 {row['annual_return']:.2%} 最大回撤 {row['max_drawdown']:.2%} "
+                  f"夏普 {row['sharpe']:.2f} 交易 {row['trades']:.1f} 胜率 {row['win_rate']:.1%}")
+    print(f'{len(rows)} 次回测，用时 {time.perf_counter() - started:.2f}s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
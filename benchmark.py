@@ -0,0 +1,460 @@
+import os
+import gc
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# 数据、指标与渲染热路径的基准测试：
+# - 按 股票数 × 年数 生成可复现的合成日K库（固定随机种子、固定截止日期），放在独立的工作目录中，
+#   数据库与各级缓存都使用相对路径，切换到该目录后与线上读取路径完全一致
+# - 各阶段分别计时：表结构识别、SQL 查询、日期解析、读取（列式缓存关/开）、周期合成、指标计算、
+#   序列化，以及经 Flask 测试客户端的完整请求
+# - 结果写成 JSON；compare 与保存的基线比较，中位数变慢超过阈值的阶段记为回归并返回非零
+#
+#   python benchmark.py run --codes 200 --years 10 --output bench.json
+#   python benchmark.py run --baseline bench.json          # 运行并与基线比较
+#   python benchmark.py compare bench.json new.json --threshold 0.15
+
+RESULT_VERSION = 1
+DEFAULT_ROOT = os.path.join('stock-data', 'bench')
+END_DATE = '2025-12-31'
+TRADING_DAYS_PER_YEAR = 244
+DEFAULT_THRESHOLD = 0.10
+MIN_DELTA_MS = 0.05     # 中位数差距小于该值时视为计时噪声，不判定回归
+PERIODS = ('week', 'month', 'year')
+
+
+def _bench_dir(root: str, codes: int, years: int, date_kind: str, seed: int) -> str:
+    return os.path.abspath(os.path.join(root, f'{codes}x{years}-{date_kind}-s{seed}'))
+
+
+def generate_db(path: str, codes: int, years: int, seed: int = 0, date_kind: str = 'text') -> int:
+    """
+    生成合成日K库：表 stock_daily(ts_code, name, trade_date, open, high, low, close, vol)，
+    每只股票在 END_DATE 之前 years 年的工作日上做几何随机游走。
+    :param date_kind: 'text' 存 yyyymmdd 文本，'int' 存 yyyymmdd 整数
+    :return: 写入的行数
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=END_DATE, periods=years * TRADING_DAYS_PER_YEAR)
+    stored = dates.strftime('%Y%m%d')
+    date_values = stored.astype(np.int64).tolist() if date_kind == 'int' else stored.tolist()
+    n = len(dates)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    rows = 0
+    try:
+        conn.execute(f'''
+            CREATE TABLE stock_daily (
+                ts_code TEXT, name TEXT, trade_date {'INTEGER' if date_kind == 'int' else 'TEXT'},
+                open REAL, high REAL, low REAL, close REAL, vol REAL
+            )''')
+        with conn:
+            for i in range(codes):
+                code, name = f'{i:06d}.SZ', f'股票{i}'
+                close = rng.uniform(5, 50) * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+                open_ = np.concatenate(([close[0]], close[:-1])) * np.exp(rng.normal(0, 0.005, n))
+                high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+                low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+                vol = np.round(rng.lognormal(12, 0.5, n))
+                prices = np.round(np.column_stack([open_, high, low, close]), 2).tolist()
+                conn.executemany('INSERT INTO stock_daily VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                 ((code, name, d, *p, v) for d, p, v in zip(date_values, prices, vol.tolist())))
+                rows += n
+    finally:
+        conn.close()
+    return rows
+
+
+def prepare_workdir(root: str, codes: int, years: int, seed: int = 0, date_kind: str = 'text',
+                    regenerate: bool = False) -> str:
+    """
+    准备（必要时生成）参数对应的工作目录，返回其绝对路径；同一组参数的库会被复用
+    """
+    workdir = _bench_dir(root, codes, years, date_kind, seed)
+    db_path = os.path.join(workdir, 'stock-data', 'stock_data.db')
+    if regenerate or not os.path.exists(db_path):
+        started = time.perf_counter()
+        rows = generate_db(db_path, codes, years, seed, date_kind)
+        print(f'已生成 {db_path}：{codes} 只 × {years} 年，{rows} 行，用时 {time.perf_counter() - started:.1f}s')
+    return workdir
+
+
+class Stage(NamedTuple):
+    name: str
+    description: str
+    run: Callable[['_Context', str], Any]
+    prepare: Optional[Callable[['_Context', str], None]] = None   # 每次调用前执行，不计入耗时
+
+
+class _Context:
+    """各阶段共用的输入，按股票懒计算，保证每个阶段只计时自己那一步"""
+
+    def __init__(self):
+        import db_utils
+        self.conn = sqlite3.connect(db_utils.DB_PATH)
+        for pragma in db_utils.READ_PRAGMAS:
+            self.conn.execute(pragma)
+        self._inputs: Dict[Any, Any] = {}
+        self._client = None
+
+    def memo(self, key, compute):
+        if key not in self._inputs:
+            self._inputs[key] = compute()
+        return self._inputs[key]
+
+    def query_sql(self) -> str:
+        # 与 db_utils.read_stock_data 未命中缓存时相同的查询
+        import db_utils
+
+        def build():
+            table, colmap = db_utils.get_table_and_columns()
+            cols = [colmap[f] for f in ('open', 'high', 'low', 'close', 'date', 'vol') if colmap[f]]
+            sel_cols = ', '.join([f'"{c}"' for c in cols])
+            return f'SELECT {sel_cols} FROM "{table}" WHERE "{colmap["code"]}" = ?'
+        return self.memo('sql', build)
+
+    def raw_dates(self, code: str) -> pd.Series:
+        import db_utils
+
+        def load():
+            _, colmap = db_utils.get_table_and_columns()
+            return pd.read_sql_query(self.query_sql(), self.conn, params=[code])[colmap['date']]
+        return self.memo(('raw_dates', code), load)
+
+    def daily(self, code: str) -> pd.DataFrame:
+        import db_utils
+        return self.memo(('daily', code), lambda: _uncached_read(db_utils.read_stock_data, code))
+
+    def with_indicators(self, code: str) -> pd.DataFrame:
+        from indicator_registry import compute_indicators
+        return self.memo(('indicators', code), lambda: compute_indicators(self.daily(code), _indicator_columns()))
+
+    def payload(self, code: str) -> Dict[str, Any]:
+        from chart_payload import kline_payload
+        return self.memo(('payload', code), lambda: kline_payload(self.with_indicators(code), True))
+
+    @property
+    def client(self):
+        if self._client is None:
+            os.environ.pop('STOCK_WARMUP', None)
+            from app import app
+            app.testing = True
+            self._client = app.test_client()
+        return self._client
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, expect: int = 200):
+        response = self.client.get(url, headers=headers or {})
+        response.get_data()
+        if response.status_code != expect:
+            raise RuntimeError(f'{url} 返回 {response.status_code}，预期 {expect}')
+        return response
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _indicator_columns() -> List[str]:
+    # /api/kline?indicators=all 计算的指标列
+    from chart_payload import INDICATOR_COLUMNS, indicator_column
+    return [indicator_column(key)[0] for key in INDICATOR_COLUMNS]
+
+
+def _uncached_read(read, code: str) -> pd.DataFrame:
+    import column_cache
+    enabled, column_cache.ENABLED = column_cache.ENABLED, False
+    try:
+        return read(code)
+    finally:
+        column_cache.ENABLED = enabled
+
+
+def _schema(ctx, code):
+    import db_utils
+    db_utils.invalidate_schema_cache()
+    db_utils.get_table_and_columns()
+    return db_utils.get_date_format()
+
+
+def _query(ctx, code):
+    return pd.read_sql_query(ctx.query_sql(), ctx.conn, params=[code])
+
+
+def _dates(ctx, code):
+    import db_utils
+    return db_utils.normalize_trade_dates(ctx.raw_dates(code), db_utils.get_date_format())
+
+
+def _read_cold(ctx, code):
+    import db_utils
+    return _uncached_read(db_utils.read_stock_data, code)
+
+
+def _read_cached(ctx, code):
+    import db_utils
+    return db_utils.read_stock_data(code)
+
+
+def _warm_column_cache(ctx, code):
+    import column_cache
+    import db_utils
+    if column_cache.ENABLED and column_cache.stored_version(code) is None:
+        db_utils.read_stock_data(code)
+
+
+def _resample(ctx, code):
+    from resample import resample_all
+    return resample_all(ctx.daily(code), PERIODS)
+
+
+def _indicators(ctx, code):
+    from indicator_registry import compute_indicators
+    return compute_indicators(ctx.daily(code), _indicator_columns())
+
+
+def _serialize(ctx, code):
+    from chart_payload import kline_payload
+    from json_provider import dumps
+    return dumps(kline_payload(ctx.with_indicators(code), True))
+
+
+def _serialize_dumps(ctx, code):
+    from json_provider import dumps
+    return dumps(ctx.payload(code))
+
+
+def _kline_url(code: str) -> str:
+    return f'/api/kline/{code}?indicators=all'
+
+
+def _drop_payload(ctx, code):
+    import payload_cache
+    payload_cache.invalidate(code)
+
+
+def _route_kline(ctx, code):
+    return ctx.get(_kline_url(code))
+
+
+def _route_kline_304(ctx, code):
+    etag = ctx.memo(('etag', code), lambda: ctx.get(_kline_url(code)).headers['ETag'])
+    return ctx.get(_kline_url(code), {'If-None-Match': etag}, expect=304)
+
+
+def _route_stock2(ctx, code):
+    return ctx.get(f'/stock2/{code}')
+
+
+STAGES = [
+    Stage('schema', '表结构与日期格式识别（清空缓存后）', _schema),
+    Stage('query', 'SQL 查询单只股票全部日K', _query),
+    Stage('dates', '日期列解析为 datetime64', _dates),
+    Stage('read', 'read_stock_data（列式缓存关闭）', _read_cold),
+    Stage('read_cached', 'read_stock_data（列式缓存命中）', _read_cached, _warm_column_cache),
+    Stage('resample', f'日K合成 {"/".join(PERIODS)}', _resample),
+    Stage('indicators', '计算 indicators=all 的全部指标', _indicators),
+    Stage('serialize', '生成图表数据并编码 JSON', _serialize),
+    Stage('serialize_dumps', '只编码 JSON', _serialize_dumps),
+    Stage('route_kline', '/api/kline?indicators=all（响应缓存清空）', _route_kline, _drop_payload),
+    Stage('route_kline_cached', '/api/kline?indicators=all（响应缓存命中）', _route_kline),
+    Stage('route_kline_304', '/api/kline?indicators=all（If-None-Match 命中）', _route_kline_304),
+    Stage('route_stock2', '/stock2 页面渲染', _route_stock2),
+]
+STAGE_NAMES = [s.name for s in STAGES]
+
+
+def _summarize(samples: Sequence[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {'calls': int(len(ms)), 'median_ms': float(np.median(ms)), 'p95_ms': float(np.percentile(ms, 95)),
+            'min_ms': float(ms.min()), 'mean_ms': float(ms.mean()), 'total_ms': float(ms.sum())}
+
+
+def time_stage(stage: Stage, ctx: _Context, codes: Sequence[str], repeat: int) -> Dict[str, float]:
+    """每只股票先不计时调用一次预热，再计时 repeat 轮"""
+    for code in codes:
+        if stage.prepare:
+            stage.prepare(ctx, code)
+        stage.run(ctx, code)
+    samples = []
+    gc.collect()
+    for _ in range(repeat):
+        for code in codes:
+            if stage.prepare:
+                stage.prepare(ctx, code)
+            started = time.perf_counter()
+            stage.run(ctx, code)
+            samples.append(time.perf_counter() - started)
+    return _summarize(samples)
+
+
+def _git_commit(path: str) -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=path, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'sqlite': sqlite3.sqlite_version,
+            'commit': _git_commit(os.path.dirname(os.path.abspath(__file__)))}
+
+
+def run_benchmark(codes: int = 100, years: int = 10, sample: int = 10, repeat: int = 5, seed: int = 0,
+                  date_kind: str = 'text', stages: Optional[Sequence[str]] = None, root: str = DEFAULT_ROOT,
+                  regenerate: bool = False) -> Dict[str, Any]:
+    """
+    在合成库上运行基准测试。
+    :param sample: 参与计时的股票数（按 seed 固定抽取）；repeat: 每只股票的计时轮数
+    :param stages: 只运行这些阶段（默认全部）
+    :return: {'version', 'meta', 'stages': {阶段: {calls, median_ms, p95_ms, min_ms, mean_ms, total_ms}}}
+    :raises ValueError: 有不认识的阶段名
+    """
+    selected = [s for s in STAGES if not stages or s.name in stages]
+    unknown = sorted(set(stages or ()) - set(STAGE_NAMES))
+    if unknown:
+        raise ValueError(f'不支持的阶段: {", ".join(unknown)}')
+    workdir = prepare_workdir(root, codes, years, seed, date_kind, regenerate)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    # 数据库与缓存都是相对路径，导入数据模块前切换到工作目录
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        import column_cache
+        import db_utils
+        import payload_cache
+        db_utils.ensure_indexes()
+        db_utils.invalidate_schema_cache()
+        column_cache.invalidate()
+        payload_cache.invalidate()
+        payload_cache.DISK_DIR = None   # 只用进程内缓存，结果不受上次运行残留影响
+
+        rng = np.random.default_rng(seed)
+        picked = sorted(rng.choice(codes, size=min(sample, codes), replace=False).tolist())
+        sample_codes = [f'{i:06d}.SZ' for i in picked]
+        ctx = _Context()
+        results: Dict[str, Dict[str, float]] = {}
+        try:
+            for stage in selected:
+                results[stage.name] = time_stage(stage, ctx, sample_codes, repeat)
+                print(f'{stage.name:20s} {results[stage.name]["median_ms"]:9.3f} ms  {stage.description}')
+        finally:
+            ctx.close()
+    finally:
+        os.chdir(cwd)
+    meta = {'codes': codes, 'years': years, 'rows_per_code': years * TRADING_DAYS_PER_YEAR, 'sample': len(sample_codes),
+            'repeat': repeat, 'seed': seed, 'date_kind': date_kind, 'created': datetime.now().isoformat(timespec='seconds'),
+            **_environment()}
+    return {'version': RESULT_VERSION, 'meta': meta, 'stages': results}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD,
+            min_delta_ms: float = MIN_DELTA_MS) -> List[Dict[str, Any]]:
+    """
+    按中位数比较两次结果：变慢超过 threshold（比例）且差值不小于 min_delta_ms 记为 'regression'，
+    同样幅度的变快记为 'improved'，其余为 'ok'；只出现在一边的阶段为 'new'/'missing'
+    :return: 每个阶段一项 {'stage', 'baseline_ms', 'current_ms', 'change', 'status'}
+    """
+    base_stages, cur_stages = baseline.get('stages', {}), current.get('stages', {})
+    rows = []
+    for name in list(base_stages) + [n for n in cur_stages if n not in base_stages]:
+        base = base_stages.get(name, {}).get('median_ms')
+        cur = cur_stages.get(name, {}).get('median_ms')
+        if base is None or cur is None:
+            rows.append({'stage': name, 'baseline_ms': base, 'current_ms': cur, 'change': None,
+                         'status': 'new' if base is None else 'missing'})
+            continue
+        change = (cur - base) / base if base else 0.0
+        status = 'ok'
+        if abs(cur - base) >= min_delta_ms:
+            if change > threshold:
+                status = 'regression'
+            elif change < -threshold:
+                status = 'improved'
+        rows.append({'stage': name, 'baseline_ms': base, 'current_ms': cur, 'change': change, 'status': status})
+    return rows
+
+
+_COMPARED_META = ('codes', 'years', 'sample', 'repeat', 'seed', 'date_kind', 'python', 'cpus')
+
+
+def _print_comparison(baseline: Dict[str, Any], current: Dict[str, Any], rows: List[Dict[str, Any]]) -> int:
+    differs = [k for k in _COMPARED_META if baseline.get('meta', {}).get(k) != current.get('meta', {}).get(k)]
+    if differs:
+        print(f'注意：两次运行的参数或环境不同（{", ".join(differs)}），结果不完全可比', file=sys.stderr)
+    for r in rows:
+        base = '-' if r['baseline_ms'] is None else f'{r["baseline_ms"]:9.3f}'
+        cur = '-' if r['current_ms'] is None else f'{r["current_ms"]:9.3f}'
+        change = '' if r['change'] is None else f'{r["change"] * 100:+7.1f}%'
+        print(f'{r["stage"]:20s} {base:>9s} -> {cur:>9s} ms {change:>8s}  {r["status"]}')
+    regressions = [r['stage'] for r in rows if r['status'] == 'regression']
+    print(f'回归 {len(regressions)} 项' + (f'：{", ".join(regressions)}' if regressions else ''))
+    return 1 if regressions else 0
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='数据、指标与渲染热路径基准测试')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='生成（或复用）合成库并分阶段计时')
+    run.add_argument('--codes', type=int, default=100, help='合成库的股票数')
+    run.add_argument('--years', type=int, default=10, help='每只股票的年数')
+    run.add_argument('--sample', type=int, default=10, help='参与计时的股票数')
+    run.add_argument('--repeat', type=int, default=5, help='每只股票的计时轮数')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--date-kind', choices=['text', 'int'], default='text', help='日期存储为 yyyymmdd 文本或整数')
+    run.add_argument('--stages', default=None, help=f'逗号分隔的阶段名，可选 {",".join(STAGE_NAMES)}')
+    run.add_argument('--root', default=DEFAULT_ROOT, help='合成库所在目录')
+    run.add_argument('--regenerate', action='store_true', help='重新生成合成库')
+    run.add_argument('--output', default=None, help='结果 JSON 路径')
+    run.add_argument('--baseline', default=None, help='与该基线 JSON 比较')
+    cmp_ = sub.add_parser('compare', help='比较两次结果，有回归时返回非零')
+    cmp_.add_argument('baseline')
+    cmp_.add_argument('current')
+    for p in (run, cmp_):
+        p.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='中位数变慢超过该比例记为回归')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        baseline, current = _load(args.baseline), _load(args.current)
+        return _print_comparison(baseline, current, compare(baseline, current, args.threshold))
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()] if args.stages else None
+    try:
+        result = run_benchmark(args.codes, args.years, args.sample, args.repeat, args.seed, args.date_kind,
+                               stages, args.root, args.regenerate)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.output}')
+    if args.baseline:
+        baseline = _load(args.baseline)
+        return _print_comparison(baseline, result, compare(baseline, result, args.threshold))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+import payload_cache
+from json_provider import dumps
+from db_utils import format_trade_dates, get_data_version, read_stock_data
+from downsample import bucket_starts, downsample_ohlcv, lttb, MIN_POINTS
+from indicator_store import load_indicator_frame
+from resample import period_start, resample_ohlcv
+from indicator_registry import compute_indicators, resolve, warmup_bars
+from technical_indicators import trading_days_per_bar, warmup_start
+
+# 前端指标字段 -> (DataFrame 列名, 缺失值填充)
+INDICATOR_COLUMNS = {
+    'vol': ('vol', 0),
+    'ma5': ('MA5', 0),
+    'ma10': ('MA10', 0),
+    'ma20': ('MA20', 0),
+    'ma30': ('MA30', 0),
+    'rsi': ('RSI', 50),
+    'macd': ('MACD', 0),
+    'macd_signal': ('MACD_Signal', 0),
+    'macd_histogram': ('MACD_Histogram', 0),
+    'bb_upper': ('BB_Upper', 0),
+    'bb_middle': ('BB_Middle', 0),
+    'bb_lower': ('BB_Lower', 0),
+    'kdj_k': ('KDJ_K', 50),
+    'kdj_d': ('KDJ_D', 50),
+    'kdj_j': ('KDJ_J', 50),
+}
+
+
+def indicator_column(key):
+    """
+    前端指标字段 -> (DataFrame 列名, 缺失值填充)；不在 INDICATOR_COLUMNS 中的字段
+    交给指标注册表解析（支持自定义周期，如 ma7、rsi6），都不认识时返回 None
+    """
+    if key in INDICATOR_COLUMNS:
+        return INDICATOR_COLUMNS[key]
+    resolved = resolve(key)
+    if resolved is None:
+        return None
+    return resolved.column, resolved.spec.fill
+
+
+def _indicator_keys(indicators):
+    return list(INDICATOR_COLUMNS) if indicators is True else list(indicators)
+
+
+def kline_values(data):
+    """
+    K线数值：[[open, close, low, high], ...]，整列转换后一次性生成列表
+    """
+    columns = [pd.to_numeric(data[c]).to_numpy(dtype=np.float64) for c in ('open', 'close', 'low', 'high')]
+    return np.column_stack(columns).tolist()
+
+
+def _series_values(series, fill):
+    values = series.to_numpy()
+    if values.dtype.kind == 'f':
+        values = np.where(np.isnan(values), fill, values)
+    return values.tolist()
+
+
+def indicators_payload(data, keys=None):
+    """
+    指标序列：{'ma5': [...], 'rsi': [...], ...}，缺失值按指标填充默认值
+    :param keys: 只输出这些指标（默认全部）
+    """
+    keys = INDICATOR_COLUMNS.keys() if keys is None else keys
+    result = {}
+    for key in keys:
+        column, fill = indicator_column(key)
+        if column in data.columns:
+            result[key] = _series_values(data[column], fill)
+    return result
+
+
+def kline_payload(data, indicators=False):
+    """
+    单个周期的图表数据：{'dates': [...], 'values': [...], 'indicators': {...}}
+    :param indicators: True 输出全部指标，也可以传入指标名列表
+    """
+    payload = {
+        'dates': format_trade_dates(data['trade_date']),
+        'values': kline_values(data),
+    }
+    if indicators:
+        payload['indicators'] = indicators_payload(data, None if indicators is True else indicators)
+    return payload
+
+
+def downsample_frame(data, points, indicators=None):
+    """
+    把K线降采样到 points 根：K线按桶合成（保留最高/最低），成交量按桶求和，
+    其余指标线用 LTTB 在同一组桶上选点。
+    :param indicators: 需要保留的指标，含义同 kline_payload
+    """
+    starts = bucket_starts(len(data), points)
+    arrays = {'trade_date': data['trade_date'].to_numpy(dtype='datetime64[s]')}
+    for field in ('open', 'high', 'low', 'close', 'vol'):
+        if field in data.columns:
+            arrays[field] = pd.to_numeric(data[field], errors='coerce').to_numpy(dtype=np.float64)
+    if 'vol' in arrays:
+        arrays['vol'] = np.nan_to_num(arrays['vol'])
+    result = pd.DataFrame(downsample_ohlcv(arrays, starts))
+
+    if indicators:
+        columns, series = [], []
+        for key in _indicator_keys(indicators):
+            column, fill = indicator_column(key)
+            if column in data.columns and column not in result.columns:
+                values = pd.to_numeric(data[column], errors='coerce').to_numpy(dtype=np.float64)
+                columns.append(column)
+                series.append(np.where(np.isnan(values), fill, values))
+        if columns:
+            # 所有指标线一起做 LTTB，每条线各自选点
+            picked = lttb(np.column_stack(series), starts)
+            for i, column in enumerate(columns):
+                result[column] = picked[:, i]
+    return result
+
+
+def _compute_kline_frame(code, period, start, end, last_n, indicators):
+    # 实时计算：读取窗口（含指标预热需要的日K）、合成周期、计算指标后裁掉预热部分
+    columns = [indicator_column(key)[0] for key in _indicator_keys(indicators)] if indicators else []
+    days_per_bar = trading_days_per_bar(period)
+    warmup = warmup_bars(columns)
+    fetch_start = None
+    if start:
+        # 至少从 start 所在周期的第一天开始读，否则第一根周期K线只由部分交易日合成
+        fetch_start = min(warmup_start(start, warmup, period), period_start(start, period))
+    fetch_n = (last_n + warmup + 1) * days_per_bar if last_n else None
+    data = read_stock_data(code, start=fetch_start, end=end, last_n=fetch_n)
+    # 窗口内没有数据时返回空表（输出空数组），只有整只股票都没有数据时才返回 None
+    if data.empty and not get_data_version(code)['rows']:
+        return None
+
+    if period != 'day':
+        data = resample_ohlcv(data, period)
+        if 'vol' not in data.columns:
+            data['vol'] = 0
+    if columns:
+        # 只计算请求的指标，共用的中间结果只算一次
+        data = compute_indicators(data, columns)
+
+    if start:
+        data = data[data['trade_date'] >= pd.Timestamp(start)]
+    if last_n:
+        data = data.tail(last_n)
+    return data.reset_index(drop=True)
+
+
+def build_kline_payload(code, period='day', start=None, end=None, last_n=None, indicators=None, points=None):
+    """
+    读取单只股票、合成到 period 周期、按需计算指标，生成该周期的图表数据。
+    :param start/end: 日期窗口；last_n: 只取最近 N 根 period 周期的K线
+    :param indicators: None 不计算指标，True 输出全部，或指标名列表
+    :param points: 目标点数；K线数量超过它时降采样（见 downsample_frame），
+                   payload['downsampled'] 标记是否降采样过
+    :return: kline_payload 的结果（窗口内没有K线时各数组为空）；数据库中没有该股票数据时返回 None
+    """
+    data = None
+    # 有离线预计算的指标表时直接切片读取（周期K线在 end 处会被截断成半根，这种情况仍实时计算）
+    if indicators and (period == 'day' or end is None):
+        data = load_indicator_frame(code, period, start=start, end=end, last_n=last_n)
+        # 预计算表只有固定的一组指标，请求了自定义周期时实时计算
+        if data is not None and any(indicator_column(k)[0] not in data.columns for k in _indicator_keys(indicators)):
+            data = None
+    if data is None:
+        data = _compute_kline_frame(code, period, start, end, last_n, indicators)
+        if data is None:
+            return None
+
+    downsampled = bool(points) and len(data) > max(points, MIN_POINTS)
+    if downsampled:
+        data = downsample_frame(data, points, indicators)
+    payload = kline_payload(data, indicators)
+    payload['downsampled'] = downsampled
+    return payload
+
+
+def kline_cache_key(code, period='day', start=None, end=None, last_n=None, indicators=None, points=None):
+    """kline_json 的缓存键（同样用于 HTTP ETag），参数同 build_kline_payload"""
+    indicator_key = 'all' if indicators is True else tuple(sorted(indicators or ()))
+    return (code, period, indicator_key, start, end, last_n, points)
+
+
+def kline_json(code, period='day', start=None, end=None, last_n=None, indicators=None, points=None):
+    """
+    build_kline_payload 的 JSON 结果（utf-8 字节串，附带 code/period 字段），经 payload_cache 缓存。
+    缓存键包含全部请求参数，并以该股票的数据版本（行数、最大日期）校验，新数据入库后自动失效。
+    :return: 数据库中没有该股票数据时返回 None
+    """
+    version = get_data_version(code)
+    if not version['rows']:
+        return None
+    key = kline_cache_key(code, period, start, end, last_n, indicators, points)
+
+    def compute():
+        payload = build_kline_payload(code, period=period, start=start, end=end, last_n=last_n,
+                                      indicators=indicators, points=points)
+        if payload is None:
+            return None
+        payload['code'] = code
+        payload['period'] = period
+        return dumps(payload).encode('utf-8')
+
+    return payload_cache.get_or_compute(key, version, compute)
+
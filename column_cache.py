@@ -0,0 +1,90 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import numpy as np
+from typing import Optional, Dict, Any
+
+# 列式缓存：每只股票一个目录，每列一个 .npy 文件，读取时内存映射（零拷贝）
+CACHE_DIR = os.path.join('stock-data', 'column-cache')
+ENABLED = os.environ.get('STOCK_COLUMN_CACHE', '1') != '0'
+
+DATE_FIELD = 'trade_date'
+META_FILE = 'meta.json'
+
+
+def _code_dir(code: str, cache_dir: str = CACHE_DIR) -> str:
+    safe = re.sub(r'[^0-9A-Za-z._-]', '_', code)
+    return os.path.join(cache_dir, safe)
+
+
+def load(code: str, version: Dict[str, Any], cache_dir: str = CACHE_DIR) -> Optional[Dict[str, np.ndarray]]:
+    """
+    读取缓存；version 与缓存时记录的源数据版本（db_utils.get_data_version）不一致时返回 None。
+    返回的数组为写时复制的内存映射：加载不拷贝数据，调用方可以像普通数组一样修改，
+    修改只落在进程私有的页上，不会写回缓存文件。读取结果是否来自缓存对调用方不可见。
+    :param cache_dir: 缓存根目录，默认为日K列缓存；指标表等其它列式数据使用各自的目录
+    """
+    path = _code_dir(code, cache_dir)
+    try:
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != version:
+            return None
+        arrays = {}
+        for field in [DATE_FIELD] + meta['fields']:
+            arrays[field] = np.load(os.path.join(path, f'{field}.npy'), mmap_mode='c')
+    except (OSError, ValueError, KeyError):
+        return None
+    # 并发重建时可能读到新旧混合的文件，长度不一致就当作未命中
+    if any(len(a) != meta['rows'] for a in arrays.values()):
+        return None
+    return arrays
+
+
+def stored_version(code: str, cache_dir: str = CACHE_DIR) -> Optional[Dict[str, Any]]:
+    """只读取缓存记录的源数据版本（不加载数组），没有缓存时返回 None"""
+    try:
+        with open(os.path.join(_code_dir(code, cache_dir), META_FILE), encoding='utf-8') as f:
+            return json.load(f).get('version')
+    except (OSError, ValueError):
+        return None
+
+
+def store(code: str, version: Dict[str, Any], arrays: Dict[str, np.ndarray], cache_dir: str = CACHE_DIR) -> None:
+    """
+    写入缓存：先写临时目录再整体替换，读者不会看到写了一半的文件。
+    arrays 必须包含 trade_date(datetime64) 以及若干数值列，且已按日期排序。
+    """
+    path = _code_dir(code, cache_dir)
+    tmp_path = old_path = None
+    try:
+        # 同一进程内多个请求线程可能同时重建同一只股票，临时目录名必须各不相同
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=f'{os.path.basename(path)}.tmp-')
+        old_path = f'{tmp_path}.old'
+        fields = [f for f in arrays if f != DATE_FIELD]
+        np.save(os.path.join(tmp_path, f'{DATE_FIELD}.npy'),
+                np.asarray(arrays[DATE_FIELD], dtype='datetime64[s]'))
+        for field in fields:
+            np.save(os.path.join(tmp_path, f'{field}.npy'), np.asarray(arrays[field], dtype=np.float64))
+        meta = {'version': version, 'rows': len(arrays[DATE_FIELD]), 'fields': fields}
+        with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 另一个线程或进程同时在写同一只股票（或磁盘不可写），放弃本次写入即可，调用方照常使用查询结果
+        pass
+    finally:
+        if tmp_path:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            shutil.rmtree(old_path, ignore_errors=True)
+
+
+def invalidate(code: Optional[str] = None, cache_dir: str = CACHE_DIR) -> None:
+    """删除某只股票（或全部）的缓存"""
+    shutil.rmtree(_code_dir(code, cache_dir) if code else cache_dir, ignore_errors=True)
@@ -1,52 +1,71 @@
+import argparse
+from datetime import datetime
 
-import requests
 import pandas as pd
-from datetime import datetime
 
-# 获取东方财富行业板块数据
-def get_sector_data():
-    url = "http://push2.eastmoney.com/api/qt/clist/get"
-    params = {
-        "pn": "1",
-        "pz": "50",
-        "fs": "m:90+t:2",  # 行业板块
-        "fields": "f12,f14,f3,f62"
-    }
-    res = requests.get(url, params=params)
-    data = res.json()["data"]["diff"]
-    df = pd.DataFrame(data)
-    df.rename(columns={
-        "f12": "板块代码",
-        "f14": "板块名称",
-        "f3": "涨幅(%)",
-        "f62": "主力资金流入(万)"
-    }, inplace=True)
+import fundflow_store
+from eastmoney_client import fetch_market, fetch_northbound, fetch_sectors, run
+
+SECTOR_COLUMNS = {
+    "f12": "板块代码",
+    "f14": "板块名称",
+    "f3": "涨幅(%)",
+    "f62": "主力资金流入(万)"
+}
+MOMENTUM_DAYS = 5
+
+
+def _sector_frame(rows):
+    df = pd.DataFrame(rows, columns=list(SECTOR_COLUMNS))
+    df.rename(columns=SECTOR_COLUMNS, inplace=True)
     return df
 
+
+# 获取东方财富行业板块数据（全部板块，分页并发抓取）
+def get_sector_data():
+    return _sector_frame(run(fetch_sectors))
+
+
 # 获取北向资金数据
 def get_northbound():
-    url = "http://push2.eastmoney.com/api/qt/kamt/get"
-    params = {"fields": "hk2sh,hk2sz,sh2hk,sz2hk"}
-    res = requests.get(url, params=params).json()
-    return res["data"]
+    return run(fetch_northbound)
+
 
 # 生成雷达表
-def generate_radar_table():
-    df_sector = get_sector_data()
-    north = get_northbound()
+def generate_radar_table(excel=False, db_path=fundflow_store.DB_PATH):
+    # 板块、个股资金流向和北向资金在一个事件循环里并发抓取，快照追加到资金流向历史库
+    market = run(fetch_market)
+    conn = fundflow_store.connect(db_path)
+    counts = fundflow_store.append_snapshot(conn, market)
     date_str = datetime.now().strftime("%Y-%m-%d")
 
     # 筛选热度前5板块
-    df_top = df_sector.sort_values(by="涨幅(%)", ascending=False).head(5)
+    df_top = _sector_frame(market["sectors"]).sort_values(by="涨幅(%)", ascending=False).head(5)
     df_top["日期"] = date_str
 
     # 添加北向资金汇总
-    df_top["北向资金流入(亿)"] = (north["hk2sh"] + north["hk2sz"]) / 1e8
+    north = fundflow_store.load_northbound(conn, date_str, date_str)
+    df_top["北向资金流入(亿)"] = (north["hk2sh"].fillna(0) + north["hk2sz"].fillna(0)).iloc[-1] / 1e8 if len(north) else None
+
+    # 多日动量来自历史库
+    momentum = fundflow_store.sector_momentum(conn, MOMENTUM_DAYS).set_index("code")
+    df_top[f"{MOMENTUM_DAYS}日累计涨幅(%)"] = df_top["板块代码"].map(momentum["return_pct"])
+    df_top[f"{MOMENTUM_DAYS}日排名变化"] = df_top["板块代码"].map(momentum["rank_change"])
+    conn.close()
+
+    print(f"已保存快照: 板块 {counts['sector_flow']} 个，个股 {counts['stock_flow']} 只")
+    print(df_top.to_string(index=False))
+    # Excel 只作为可选导出
+    if excel:
+        output_path = f"板块轮动雷达表_{date_str}.xlsx"
+        fundflow_store.export_excel(df_top, output_path)
+        print(f"已生成雷达表: {output_path}")
+    return df_top
 
-    # 输出 Excel
-    output_path = f"板块轮动雷达表_{date_str}.xlsx"
-    df_top.to_excel(output_path, index=False)
-    print(f"已生成雷达表: {output_path}")
 
 if __name__ == "__main__":
-    generate_radar_table()
+    parser = argparse.ArgumentParser(description="抓取板块与资金流向快照并生成板块轮动雷达表")
+    parser.add_argument("--excel", action="store_true", help="同时导出当天的雷达表 Excel")
+    parser.add_argument("--db", default=fundflow_store.DB_PATH, help="资金流向历史库路径")
+    args = parser.parse_args()
+    generate_radar_table(excel=args.excel, db_path=args.db)
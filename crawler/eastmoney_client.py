@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 东方财富行情接口的并发抓取层：
+# - asyncio 调度，底层复用一个带连接池的 requests.Session，阻塞请求在有界线程池中执行
+# - 令牌桶限速 + 并发上限，失败（超时、连接错误、429/5xx）按指数退避重试
+# - 相同的请求同时在途时只发一次（请求合并）
+# - 列表接口先取第一页拿到 total，再并发取剩余各页
+# BASE_URL 可用环境变量 EASTMONEY_BASE_URL 指向本地回放服务器（见 eastmoney_stub.py）
+
+BASE_URL = os.environ.get('EASTMONEY_BASE_URL', 'http://push2.eastmoney.com')
+HISTORY_BASE_URL = os.environ.get('EASTMONEY_HISTORY_BASE_URL', os.environ.get('EASTMONEY_BASE_URL', 'http://push2his.eastmoney.com'))
+PAGE_SIZE = 100             # 接口单页上限
+DEFAULT_RATE = 20.0         # 每秒请求数
+DEFAULT_BURST = 10
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 0.5       # 首次重试等待秒数，之后每次翻倍
+DEFAULT_TIMEOUT = 10.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 行业板块与沪深京A股的 fs 过滤条件
+SECTOR_FS = 'm:90+t:2'
+STOCK_FS = 'm:0+t:6,m:0+t:80,m:1+t:2,m:1+t:23,m:0+t:81+s:2048'
+SECTOR_FIELDS = 'f12,f14,f3,f62'
+STOCK_FLOW_FIELDS = 'f12,f13,f14,f2,f3,f62,f184,f66,f69,f72,f75,f78,f81,f84,f87'
+
+
+class FetchError(Exception):
+    """重试次数用尽后仍然失败的请求"""
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个请求，允许 burst 个突发"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class EastmoneyClient:
+    """
+    并发抓取客户端，用法：
+        async with EastmoneyClient() as client:
+            rows = await client.get_all_pages('/api/qt/clist/get', {...})
+    """
+
+    def __init__(self, base_url: str = BASE_URL, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 concurrency: int = DEFAULT_CONCURRENCY, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT,
+                 history_base_url: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
+        # 历史数据接口在另一个域名；只指定了 base_url（如本地回放服务器）时两者相同
+        self.history_base_url = history_base_url or (HISTORY_BASE_URL if base_url == BASE_URL else self.base_url)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'Mozilla/5.0'
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self.stats = {'requests': 0, 'retries': 0, 'coalesced': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _get(self, url: str, params: Dict[str, Any]) -> requests.Response:
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None, base_url: Optional[str] = None) -> Any:
+        """GET 并解析 JSON；与在途请求完全相同时等待同一结果"""
+        url = (base_url or self.base_url).rstrip('/') + path
+        params = {k: str(v) for k, v in (params or {}).items()}
+        key = (url, tuple(sorted(params.items())))
+        if key in self._inflight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.ensure_future(self._fetch(url, params))
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def _fetch(self, url: str, params: Dict[str, str]) -> Any:
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            await self._bucket.acquire()
+            async with self._semaphore:
+                self.stats['requests'] += 1
+                try:
+                    response = await loop.run_in_executor(self._executor, self._get, url, params)
+                    if response.status_code not in RETRY_STATUS:
+                        response.raise_for_status()
+                        return response.json()
+                    error: Exception = FetchError(f'HTTP {response.status_code}')
+                except (requests.ConnectionError, requests.Timeout, ValueError) as e:
+                    error = e
+            if attempt == self.retries:
+                raise FetchError(f'{url} {params} 请求失败: {error}') from error
+            self.stats['retries'] += 1
+            # 指数退避，加随机抖动避免同时重试
+            await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    async def get_all_pages(self, path: str, params: Dict[str, Any], page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+        """
+        分页列表接口（data.total / data.diff）：取第一页得到总数后并发取其余页，按页序拼接
+        """
+        params = dict(params, pz=page_size, np=1)
+        first = await self.get_json(path, dict(params, pn=1))
+        data = (first or {}).get('data') or {}
+        rows = _diff_rows(data)
+        pages = math.ceil(int(data.get('total') or 0) / page_size)
+        if pages > 1:
+            results = await asyncio.gather(*[self.get_json(path, dict(params, pn=pn)) for pn in range(2, pages + 1)])
+            for result in results:
+                rows.extend(_diff_rows((result or {}).get('data') or {}))
+        return rows
+
+
+def _diff_rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # np=1 时 diff 为列表，旧接口返回以序号为键的字典
+    diff = data.get('diff') or []
+    return list(diff.values()) if isinstance(diff, dict) else list(diff)
+
+
+async def fetch_sectors(client: EastmoneyClient) -> List[Dict[str, Any]]:
+    """全部行业板块的涨幅与主力资金流入"""
+    return await client.get_all_pages('/api/qt/clist/get', {'fs': SECTOR_FS, 'fields': SECTOR_FIELDS,
+                                                             'fid': 'f3', 'po': 1})
+
+
+async def fetch_stock_flows(client: EastmoneyClient) -> List[Dict[str, Any]]:
+    """全市场个股当日资金流向"""
+    return await client.get_all_pages('/api/qt/clist/get', {'fs': STOCK_FS, 'fields': STOCK_FLOW_FIELDS,
+                                                             'fid': 'f62', 'po': 1})
+
+
+async def fetch_northbound(client: EastmoneyClient) -> Dict[str, Any]:
+    """北向/南向资金"""
+    result = await client.get_json('/api/qt/kamt/get', {'fields1': 'f1,f2,f3,f4', 'fields2': 'f51,f52,f53,f54,f55,f56',
+                                                        'fields': 'hk2sh,hk2sz,sh2hk,sz2hk'})
+    return (result or {}).get('data') or {}
+
+
+async def fetch_stock_flow_history(client: EastmoneyClient, secids: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    若干股票的历史日资金流向（secid 形如 '1.600000'、'0.000001'），并发抓取。
+    :return: secid -> klines（逗号分隔的原始行）
+    """
+    async def one(secid):
+        result = await client.get_json('/api/qt/stock/fflow/daykline/get',
+                                       {'secid': secid, 'lmt': 0, 'klt': 101, 'fields1': 'f1,f2,f3,f7',
+                                        'fields2': 'f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61,f62,f63,f64,f65'},
+                                       base_url=client.history_base_url)
+        return secid, ((result or {}).get('data') or {}).get('klines') or []
+
+    return dict(await asyncio.gather(*[one(s) for s in secids]))
+
+
+async def fetch_market(client: EastmoneyClient) -> Dict[str, Any]:
+    """板块、个股资金流向与北向资金一起抓取"""
+    sectors, stocks, north = await asyncio.gather(fetch_sectors(client), fetch_stock_flows(client),
+                                                  fetch_northbound(client))
+    return {'sectors': sectors, 'stocks': stocks, 'northbound': north}
+
+
+def run(coro_func, **client_options):
+    """在新的事件循环中用一个客户端执行 coro_func(client)，供同步代码调用"""
+    async def main():
+        async with EastmoneyClient(**client_options) as client:
+            return await coro_func(client)
+    return asyncio.run(main())
+
+
+def record(output_dir: str, **client_options) -> None:
+    """抓取一份真实数据保存为回放服务器使用的录制文件"""
+    async def main(client):
+        market = await fetch_market(client)
+        sample = [f"{row.get('f13', 0)}.{row['f12']}" for row in market['stocks'][:20] if 'f12' in row]
+        history = await fetch_stock_flow_history(client, sample)
+        return market, history
+
+    market, history = run(main, **client_options)
+    os.makedirs(output_dir, exist_ok=True)
+
+    def write(name, payload):
+        with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    write('clist-sectors.json', {'data': {'total': len(market['sectors']), 'diff': market['sectors']}})
+    write('clist-stocks.json', {'data': {'total': len(market['stocks']), 'diff': market['stocks']}})
+    write('kamt.json', {'data': market['northbound']})
+    write('fflow.json', {secid: {'data': {'code': secid.split('.')[1], 'klines': klines}}
+                         for secid, klines in history.items()})
+    print(f"已录制 板块 {len(market['sectors'])} 个、个股 {len(market['stocks'])} 只到 {output_dir}")
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='东方财富行情并发抓取')
+    parser.add_argument('command', choices=['market', 'record'], help='market: 抓取并打印汇总；record: 录制回放数据')
+    parser.add_argument('output', nargs='?', default='eastmoney-fixtures', help='record 的输出目录')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='每秒请求数')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='最大并发请求数')
+    args = parser.parse_args(argv)
+
+    options = {'rate': args.rate, 'concurrency': args.concurrency}
+    if args.command == 'record':
+        record(args.output, **options)
+        return 0
+    started = time.perf_counter()
+    market = run(fetch_market, **options)
+    print(f"板块 {len(market['sectors'])} 个，个股 {len(market['stocks'])} 只，"
+          f"用时 {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
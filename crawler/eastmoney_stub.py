@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# 本地回放服务器：按东方财富接口的路径与参数返回录制的 JSON（由 eastmoney_client.py record 生成），
+# 列表接口按 pn/pz 重新分页。没有录制文件时生成结构相同的模拟数据。
+# 可模拟延迟与随机失败，用来测试抓取层的并发、分页、重试与限速：
+#   python crawler/eastmoney_stub.py --port 8765 --latency 0.05 --fail-rate 0.1
+#   EASTMONEY_BASE_URL=http://127.0.0.1:8765 python crawler/eastmoney-cashflow.py
+
+
+def _synthetic_rows(prefix: str, count: int, fields: List[str]) -> List[Dict[str, Any]]:
+    rng = random.Random(prefix)
+    rows = []
+    for i in range(count):
+        row: Dict[str, Any] = {'f12': f'{prefix}{i:04d}', 'f13': i % 2, 'f14': f'{prefix}{i}'}
+        for field in fields:
+            row.setdefault(field, round(rng.uniform(-10, 10) if field == 'f3' else rng.uniform(-1e8, 1e8), 2))
+        rows.append(row)
+    return rows
+
+
+class Fixtures:
+    """录制数据（或模拟数据）"""
+
+    def __init__(self, directory: Optional[str] = None, sectors: int = 86, stocks: int = 5300):
+        self.sectors = self._load(directory, 'clist-sectors.json') or \
+            {'data': {'total': sectors, 'diff': _synthetic_rows('BK', sectors, ['f3', 'f62'])}}
+        self.stocks = self._load(directory, 'clist-stocks.json') or \
+            {'data': {'total': stocks, 'diff': _synthetic_rows('6', stocks, ['f2', 'f3', 'f62', 'f184'])}}
+        self.northbound = self._load(directory, 'kamt.json') or \
+            {'data': {'hk2sh': {'dayNetAmtIn': 123456.0}, 'hk2sz': {'dayNetAmtIn': 654321.0},
+                      'sh2hk': {'dayNetAmtIn': 0.0}, 'sz2hk': {'dayNetAmtIn': 0.0}}}
+        self.flow_history = self._load(directory, 'fflow.json') or {}
+
+    @staticmethod
+    def _load(directory, name):
+        path = os.path.join(directory, name) if directory else None
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        return None
+
+    def clist(self, query: Dict[str, str]) -> Dict[str, Any]:
+        recorded = self.sectors if query.get('fs', '').startswith('m:90') else self.stocks
+        rows = recorded['data']['diff']
+        page, size = int(query.get('pn', 1)), int(query.get('pz', 20))
+        return {'rc': 0, 'data': {'total': len(rows), 'diff': rows[(page - 1) * size:page * size]}}
+
+    def flow(self, query: Dict[str, str]) -> Dict[str, Any]:
+        secid = query.get('secid', '')
+        if secid in self.flow_history:
+            return self.flow_history[secid]
+        rng = random.Random(secid)
+        klines = [f'2024-01-{d:02d},' + ','.join(f'{rng.uniform(-1e7, 1e7):.1f}' for _ in range(14))
+                  for d in range(1, 29)]
+        return {'rc': 0, 'data': {'code': secid.split('.')[-1], 'klines': klines}}
+
+
+def make_handler(fixtures: Fixtures, latency: float, fail_rate: float, counter: Dict[str, int]):
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'   # 保持连接，便于测试客户端的连接复用
+
+        def do_GET(self):
+            with lock:
+                counter['requests'] = counter.get('requests', 0) + 1
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                return self._send(503, {'error': 'simulated failure'})
+            if url.path == '/api/qt/clist/get':
+                return self._send(200, fixtures.clist(query))
+            if url.path == '/api/qt/kamt/get':
+                return self._send(200, fixtures.northbound)
+            if url.path == '/api/qt/stock/fflow/daykline/get':
+                return self._send(200, fixtures.flow(query))
+            self._send(404, {'error': 'not found'})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int = 0, fixtures_dir: Optional[str] = None, latency: float = 0.0,
+          fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """
+    在后台线程启动回放服务器并返回（server.server_address 为实际端口，server.counter 为请求计数），
+    测试结束后调用 server.shutdown()
+    """
+    counter: Dict[str, int] = {}
+    server = ThreadingHTTPServer(('127.0.0.1', port),
+                                 make_handler(Fixtures(fixtures_dir), latency, fail_rate, counter))
+    server.daemon_threads = True
+    server.counter = counter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='东方财富接口回放服务器')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', default=None, help='录制数据目录（默认使用模拟数据）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟秒数')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='随机返回 503 的比例')
+    args = parser.parse_args(argv)
+
+    server = serve(args.port, args.fixtures, args.latency, args.fail_rate)
+    print(f'回放服务器: http://127.0.0.1:{server.server_address[1]}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# 资金流向历史库：每次抓取的板块、个股资金流向和北向资金快照按 (代码, 时间戳) 追加到 SQLite，
+# 一次快照在一个事务里用 executemany 批量写入。趋势分析（板块轮动排名、多日动量）直接在库上查询，
+# 一个月的数据是一次按时间索引的范围查询，不再逐个打开每天的 Excel。
+# 每个交易日可以抓取多次，按日分析时取当天最后一次快照。
+
+DB_PATH = os.environ.get('FUNDFLOW_DB_PATH', os.path.join('stock-data', 'fund_flow.db'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sector_flow (
+    code TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    trade_date TEXT NOT NULL,
+    name TEXT,
+    change_pct REAL,
+    main_inflow REAL,
+    PRIMARY KEY (code, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sector_flow_date ON sector_flow (trade_date, ts);
+
+CREATE TABLE IF NOT EXISTS stock_flow (
+    code TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    trade_date TEXT NOT NULL,
+    name TEXT,
+    price REAL,
+    change_pct REAL,
+    main_inflow REAL,
+    main_inflow_ratio REAL,
+    PRIMARY KEY (code, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_stock_flow_date ON stock_flow (trade_date, ts);
+
+CREATE TABLE IF NOT EXISTS northbound_flow (
+    ts INTEGER PRIMARY KEY,
+    trade_date TEXT NOT NULL,
+    hk2sh REAL,
+    hk2sz REAL,
+    sh2hk REAL,
+    sz2hk REAL
+);
+CREATE INDEX IF NOT EXISTS idx_northbound_flow_date ON northbound_flow (trade_date);
+"""
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    """打开（必要时创建）资金流向库；WAL 模式下写入快照时不阻塞查询"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _number(value: Any) -> Optional[float]:
+    # 停牌等情况下接口返回 '-'
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _net_inflow(item: Any) -> Optional[float]:
+    # kamt 接口各方向为 {'dayNetAmtIn': ...}，兼容直接给出数值的情况
+    return _number(item.get('dayNetAmtIn') if isinstance(item, dict) else item)
+
+
+def append_snapshot(conn: sqlite3.Connection, market: Dict[str, Any], ts: Optional[int] = None) -> Dict[str, int]:
+    """
+    追加一次抓取结果（eastmoney_client.fetch_market 的返回值，键 sectors/stocks/northbound 均可缺省）。
+    同一时间戳重复写入时覆盖。
+    :return: 各表写入的行数
+    """
+    ts = int(time.time()) if ts is None else int(ts)
+    trade_date = datetime.fromtimestamp(ts).strftime('%Y-%m-%d')
+    sectors = [(r['f12'], ts, trade_date, r.get('f14'), _number(r.get('f3')), _number(r.get('f62')))
+               for r in market.get('sectors') or [] if r.get('f12')]
+    stocks = [(r['f12'], ts, trade_date, r.get('f14'), _number(r.get('f2')), _number(r.get('f3')),
+               _number(r.get('f62')), _number(r.get('f184')))
+              for r in market.get('stocks') or [] if r.get('f12')]
+    north = market.get('northbound') or {}
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO sector_flow VALUES (?, ?, ?, ?, ?, ?)', sectors)
+        conn.executemany('INSERT OR REPLACE INTO stock_flow VALUES (?, ?, ?, ?, ?, ?, ?, ?)', stocks)
+        if north:
+            conn.execute('INSERT OR REPLACE INTO northbound_flow VALUES (?, ?, ?, ?, ?, ?)',
+                         (ts, trade_date, *[_net_inflow(north.get(k)) for k in ('hk2sh', 'hk2sz', 'sh2hk', 'sz2hk')]))
+    return {'sector_flow': len(sectors), 'stock_flow': len(stocks), 'northbound_flow': 1 if north else 0}
+
+
+def _date_range_sql(start: Optional[str], end: Optional[str]) -> Tuple[str, List[str]]:
+    clauses, params = [], []
+    if start:
+        clauses.append('trade_date >= ?')
+        params.append(str(pd.Timestamp(start).date()))
+    if end:
+        clauses.append('trade_date <= ?')
+        params.append(str(pd.Timestamp(end).date()))
+    return (' AND '.join(clauses) or '1'), params
+
+
+def load_sector_daily(conn: sqlite3.Connection, start: Optional[str] = None, end: Optional[str] = None,
+                      codes: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    [start, end] 内各板块每个交易日最后一次快照，附当日涨幅排名（1 为最强）。
+    :return: 列 trade_date/code/name/change_pct/main_inflow/rank 的 DataFrame
+    """
+    where, params = _date_range_sql(start, end)
+    code_filter = ''
+    if codes:
+        # 排名在全部板块中计算，再筛选代码
+        code_filter = f"WHERE code IN ({','.join('?' * len(codes))})"
+        params = params + list(codes)
+    sql = f"""
+        WITH last AS (
+            SELECT trade_date, MAX(ts) AS ts FROM sector_flow WHERE {where} GROUP BY trade_date
+        )
+        SELECT * FROM (
+            SELECT s.trade_date, s.code, s.name, s.change_pct, s.main_inflow,
+                   RANK() OVER (PARTITION BY s.trade_date ORDER BY s.change_pct DESC) AS rank
+            FROM sector_flow s JOIN last USING (trade_date, ts)
+        ) {code_filter}
+        ORDER BY trade_date, rank
+    """
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def rotation_ranks(conn: sqlite3.Connection, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    """板块每日涨幅排名矩阵（交易日 × 板块名称），用于观察轮动"""
+    daily = load_sector_daily(conn, start, end)
+    return daily.pivot(index='trade_date', columns='name', values='rank')
+
+
+def sector_momentum(conn: sqlite3.Connection, days: int = 5, end: Optional[str] = None) -> pd.DataFrame:
+    """
+    截至 end 的最近 days 个交易日各板块动量：
+    累计涨幅（复利）、累计主力净流入、平均排名与排名变化（首日排名 - 末日排名，正数为走强），按累计涨幅排序
+    """
+    where, params = _date_range_sql(None, end)
+    dates = [r[0] for r in conn.execute(
+        f'SELECT DISTINCT trade_date FROM sector_flow WHERE {where} ORDER BY trade_date DESC LIMIT ?',
+        params + [days])]
+    if not dates:
+        return pd.DataFrame(columns=['code', 'name', 'days', 'return_pct', 'main_inflow', 'avg_rank', 'rank_change'])
+    daily = load_sector_daily(conn, min(dates), max(dates))
+    grouped = daily.sort_values('trade_date').groupby('code')
+    result = pd.DataFrame({
+        'name': grouped['name'].last(),
+        'days': grouped['trade_date'].count(),
+        'return_pct': grouped['change_pct'].apply(lambda s: ((1 + s.fillna(0) / 100).prod() - 1) * 100),
+        'main_inflow': grouped['main_inflow'].sum(),
+        'avg_rank': grouped['rank'].mean(),
+        'rank_change': grouped['rank'].first() - grouped['rank'].last(),
+    })
+    return result.sort_values('return_pct', ascending=False).reset_index()
+
+
+def load_northbound(conn: sqlite3.Connection, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    """北向资金每个交易日最后一次快照"""
+    where, params = _date_range_sql(start, end)
+    sql = f"""
+        SELECT n.* FROM northbound_flow n
+        JOIN (SELECT trade_date, MAX(ts) AS ts FROM northbound_flow WHERE {where} GROUP BY trade_date) last
+        USING (trade_date, ts)
+        ORDER BY n.trade_date
+    """
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def load_stock_daily(conn: sqlite3.Connection, code: str, start: Optional[str] = None,
+                     end: Optional[str] = None) -> pd.DataFrame:
+    """一只股票每个交易日最后一次资金流向快照"""
+    where, params = _date_range_sql(start, end)
+    sql = f"""
+        SELECT trade_date, ts, name, price, change_pct, main_inflow, main_inflow_ratio
+        FROM stock_flow WHERE code = ? AND {where}
+        ORDER BY ts
+    """
+    frame = pd.read_sql_query(sql, conn, params=[code] + params)
+    return frame.groupby('trade_date', as_index=False).last()
+
+
+def export_excel(frame: pd.DataFrame, path: str) -> str:
+    """可选的 Excel 导出（需要 openpyxl）"""
+    frame.to_excel(path, index=False)
+    return path
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='资金流向历史查询')
+    parser.add_argument('--db', default=DB_PATH, help='资金流向库路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+    momentum = sub.add_parser('momentum', help='最近 N 个交易日的板块动量')
+    momentum.add_argument('--days', type=int, default=5)
+    momentum.add_argument('--end', default=None, help='截止日期（默认最新）')
+    momentum.add_argument('--top', type=int, default=10)
+    ranks = sub.add_parser('ranks', help='板块每日涨幅排名矩阵')
+    ranks.add_argument('--start', default=None)
+    ranks.add_argument('--end', default=None)
+    for p in (momentum, ranks):
+        p.add_argument('--excel', default=None, help='同时导出到该 Excel 文件')
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    if args.command == 'momentum':
+        frame = sector_momentum(conn, args.days, args.end).head(args.top)
+    else:
+        frame = rotation_ranks(conn, args.start, args.end).reset_index()
+    print(frame.to_string(index=False))
+    if args.excel:
+        print(f'已导出: {export_excel(frame, args.excel)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
@@ -1,7 +1,13 @@
 import os
+import re
 import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, Any, Tuple, List
+from typing import Optional, Dict, Any, Tuple, List, NamedTuple, Sequence
+
+import column_cache
 
 DB_PATH = os.path.join('stock-data', 'stock_data.db')
 
@@ -17,12 +23,121 @@ NAME_CANDIDATES = ['name', 'stock_name', 'sname', 'display_name']
 
 PREFERRED_TABLE_KEYWORDS = ['price', 'kline', 'daily', 'quote', 'quotes', 'stock']
 
+# 只读连接的调优参数
+READ_PRAGMAS = [
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',   # 256MB 内存映射读取
+    'PRAGMA cache_size = -65536',     # 64MB 页缓存（负数单位为 KB）
+    'PRAGMA temp_store = MEMORY',
+]
+# 每个连接缓存的预编译语句数；固定的按代码查询 SQL 文本不变，会直接命中缓存
+STATEMENT_CACHE_SIZE = 128
 
-def _get_conn() -> sqlite3.Connection:
-    if not os.path.exists(DB_PATH):
+
+def _db_file_id() -> Tuple[int, int]:
+    try:
+        st = os.stat(DB_PATH)
+    except FileNotFoundError:
         raise FileNotFoundError(f'数据库文件未找到: {DB_PATH}')
-    conn = sqlite3.connect(DB_PATH)
-    return conn
+    return st.st_dev, st.st_ino
+
+
+class _ConnectionPool:
+    """
+    线程安全的只读连接池：每个工作线程持有一个 URI 只读连接并反复复用。
+    数据库文件被替换（inode 变化）时自动重连。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: Dict[int, sqlite3.Connection] = {}
+        self._opened = 0
+        self._reused = 0
+        self._closed = 0
+        self._journal_mode: Optional[str] = None
+
+    def _open(self) -> sqlite3.Connection:
+        uri = Path(DB_PATH).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        # WAL 模式下读写互不阻塞；非 WAL 时读连接会短暂阻塞写入，这里只记录供排查
+        self._journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        return conn
+
+    def get(self) -> sqlite3.Connection:
+        file_id = _db_file_id()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.file_id == file_id:
+            with self._lock:
+                self._reused += 1
+            return conn
+        if conn is not None:
+            self._discard(threading.get_ident(), conn)
+        conn = self._open()
+        self._local.conn = conn
+        self._local.file_id = file_id
+        with self._lock:
+            self._prune_dead_threads()
+            self._conns[threading.get_ident()] = conn
+            self._opened += 1
+        return conn
+
+    def _discard(self, ident: int, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._conns.pop(ident, None)
+            self._closed += 1
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # 连接属于其它线程时无法在这里关闭，交由垃圾回收
+            pass
+
+    def _prune_dead_threads(self) -> None:
+        # 调用方需持有 self._lock；已退出线程的连接不再可用，直接丢弃引用
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._conns if i not in alive]:
+            del self._conns[ident]
+            self._closed += 1
+
+    def close_current(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self._discard(threading.get_ident(), conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'open_connections': len(self._conns),
+                'opened': self._opened,
+                'reused': self._reused,
+                'closed': self._closed,
+                'journal_mode': self._journal_mode,
+            }
+
+
+_pool = _ConnectionPool()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """
+    获取当前线程的只读连接（来自连接池，调用方不要关闭）
+    """
+    return _pool.get()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    连接池统计：当前打开的连接数、累计新建/复用/关闭次数、数据库 journal 模式
+    """
+    return _pool.stats()
+
+
+def close_thread_connection() -> None:
+    """关闭当前线程持有的只读连接（下次调用时自动重建）"""
+    _pool.close_current()
 
 
 def _list_tables(conn: sqlite3.Connection) -> List[str]:
@@ -111,57 +226,651 @@ def _find_table_and_columns(conn: sqlite3.Connection) -> Tuple[str, Dict[str, Op
     return table_name, colmap
 
 
-def _format_trade_date(df: pd.DataFrame, date_col: str) -> pd.Series:
+# 原始日期列的可识别格式；这些格式都是定长补零的，按字符串/整数比较即按时间先后
+_DATE_PATTERNS = [
+    (re.compile(r'^\d{8}$'), '%Y%m%d'),
+    (re.compile(r'^\d{4}-\d{2}-\d{2}'), '%Y-%m-%d'),
+    (re.compile(r'^\d{4}/\d{2}/\d{2}'), '%Y/%m/%d'),
+]
+
+
+def _detect_date_format(conn: sqlite3.Connection, table: str, date_col: str) -> Optional[Tuple[str, str]]:
+    """
+    抽样识别日期列的存储格式，返回 (存储类型 'int'/'text', strftime 格式)；
+    无法识别或格式混杂时返回 None，此时日期范围只能在解析后过滤。
+    """
+    sql = f'SELECT "{date_col}", typeof("{date_col}") FROM "{table}" WHERE "{date_col}" IS NOT NULL LIMIT 100'
+    rows = conn.execute(sql).fetchall()
+    kinds = {r[1] for r in rows}
+    if len(kinds) != 1 or kinds & {'real', 'blob'}:
+        return None
+    kind = 'int' if 'integer' in kinds else 'text'
+    values = [str(r[0]) for r in rows]
+    for pattern, fmt in _DATE_PATTERNS:
+        if all(pattern.match(v) for v in values):
+            if kind == 'int' and fmt != '%Y%m%d':
+                return None
+            return kind, fmt
+    return None
+
+
+class _SchemaCatalog:
+    """
+    进程级的表结构缓存：只在首次使用或数据库结构变化时扫描 sqlite_master。
+    失效条件：数据库文件或 WAL 文件的变更标记（_db_change_stamp）变化且 PRAGMA schema_version 也发生变化。
+    WAL 模式下建表、加列和空表的首批数据在检查点之前可能只写入了 -wal 文件，所以必须连同 WAL 一起判断。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, ...]] = None
+        self._schema_version: Optional[int] = None
+        self._table: Optional[str] = None
+        self._colmap: Optional[Dict[str, Optional[str]]] = None
+        self._tables: set = set()
+        self._date_format: Optional[Tuple[str, str]] = None
+
+    def resolve(self, conn: sqlite3.Connection) -> Tuple[str, Dict[str, Optional[str]]]:
+        stamp = _db_change_stamp()
+        if not any(stamp[:3]):
+            raise FileNotFoundError(f'数据库文件未找到: {DB_PATH}')
+        with self._lock:
+            if self._table is not None and stamp == self._stamp:
+                return self._table, dict(self._colmap)
+            # 文件有改动（可能只是写入了新数据），再用 schema_version 判断结构是否真的变化
+            version = conn.execute('PRAGMA schema_version').fetchone()[0]
+            if self._table is None or version != self._schema_version:
+                self._table, self._colmap = _find_table_and_columns(conn)
+                self._tables = set(_list_tables(conn))
+                self._date_format = None
+                self._schema_version = version
+            if self._date_format is None:
+                # 空表时识别不出来，等有数据写入（变更标记变化）后再试
+                self._date_format = _detect_date_format(conn, self._table, self._colmap['date'])
+            self._stamp = stamp
+            return self._table, dict(self._colmap)
+
+    def has_table(self, conn: sqlite3.Connection, name: str) -> bool:
+        self.resolve(conn)
+        return name in self._tables
+
+    def date_format(self, conn: sqlite3.Connection) -> Optional[Tuple[str, str]]:
+        self.resolve(conn)
+        return self._date_format
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stamp = None
+            self._schema_version = None
+            self._table = None
+            self._colmap = None
+            self._tables = set()
+            self._date_format = None
+
+
+_schema_catalog = _SchemaCatalog()
+
+
+def get_table_and_columns(conn: Optional[sqlite3.Connection] = None) -> Tuple[str, Dict[str, Optional[str]]]:
+    """
+    返回价格表名及列名映射（带进程级缓存），结构同 _find_table_and_columns。
+    """
+    if conn is None:
+        conn = _get_conn()
+    return _schema_catalog.resolve(conn)
+
+
+def get_date_format(conn: Optional[sqlite3.Connection] = None) -> Optional[Tuple[str, str]]:
+    """
+    价格表日期列的存储格式 (存储类型 'int'/'text', strftime 格式)；无法识别（如空表）时返回 None
+    """
+    if conn is None:
+        conn = _get_conn()
+    return _schema_catalog.date_format(conn)
+
+
+def preload_schema() -> bool:
+    """
+    应用启动时预先解析表结构；数据库不存在或无法识别时返回 False，不影响启动。
+    """
+    try:
+        get_table_and_columns()
+        return True
+    except (FileNotFoundError, RuntimeError, sqlite3.Error):
+        return False
+
+
+def invalidate_schema_cache() -> None:
+    """手动清空表结构缓存（例如外部工具重建了数据库之后）"""
+    _schema_catalog.invalidate()
+
+
+def _get_write_conn() -> sqlite3.Connection:
+    """
+    维护任务（建索引、同步目录表）使用的可写连接，用完需自行关闭
+    """
+    _db_file_id()
+    return sqlite3.connect(DB_PATH)
+
+
+def _code_date_index_name(table: str) -> str:
+    return f'idx_{table}_code_date'
+
+
+def _index_columns(conn: sqlite3.Connection, table: str) -> List[List[str]]:
+    """返回表上每个索引的列顺序"""
+    result = []
+    for row in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+        # row: (seq, name, unique, origin, partial)
+        if row[4]:
+            continue
+        cols = [r[2] for r in conn.execute(f'PRAGMA index_info("{row[1]}")').fetchall()]
+        result.append(cols)
+    return result
+
+
+def advise_indexes(covering: bool = True, conn: Optional[sqlite3.Connection] = None) -> List[str]:
+    """
+    检查价格表是否具备 (code, date) 复合索引，返回缺失索引的建表语句（已具备则为空列表）。
+    covering=True 时把 OHLC/成交量列也放进索引，按代码读取K线可以只走索引不回表。
+    """
+    if conn is None:
+        conn = _get_conn()
+    table, colmap = get_table_and_columns(conn)
+    wanted = [colmap['code'], colmap['date']]
+    if covering:
+        wanted += [colmap[k] for k in ('open', 'high', 'low', 'close', 'vol') if colmap[k]]
+
+    wanted_lower = [c.lower() for c in wanted]
+    for cols in _index_columns(conn, table):
+        if [c.lower() for c in cols[:len(wanted)]] == wanted_lower:
+            return []
+
+    cols_sql = ', '.join(f'"{c}"' for c in wanted)
+    return [f'CREATE INDEX IF NOT EXISTS "{_code_date_index_name(table)}" ON "{table}" ({cols_sql})']
+
+
+def ensure_indexes(covering: bool = True) -> List[str]:
+    """
+    创建缺失的 (code, date) 索引，返回实际执行的语句
+    """
+    statements = advise_indexes(covering=covering)
+    if not statements:
+        return []
+    conn = _get_write_conn()
+    try:
+        with conn:
+            # 旧的非覆盖索引与新索引同名时先删除再重建
+            if covering:
+                table, _ = get_table_and_columns()
+                conn.execute(f'DROP INDEX IF EXISTS "{_code_date_index_name(table)}"')
+            for sql in statements:
+                conn.execute(sql)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return statements
+
+
+CATALOG_TABLE = 'stock_catalog'
+
+
+def refresh_stock_catalog() -> int:
+    """
+    重建物化的 stock_catalog(code, name) 目录表，并在价格表上安装触发器保持同步。
+    股票列表页和 get_stock_name 随后只需按主键查询目录表。返回目录中的股票数量。
+    """
+    table, colmap = get_table_and_columns()
+    code_col = colmap['code']
+    name_col = colmap['name']
+    name_expr = f'"{name_col}"' if name_col else 'NULL'
+    new_name = f'NEW."{name_col}"' if name_col else 'NULL'
+
+    conn = _get_write_conn()
+    try:
+        with conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS "{CATALOG_TABLE}" (
+                    code TEXT PRIMARY KEY,
+                    name TEXT
+                ) WITHOUT ROWID''')
+            conn.execute(f'DELETE FROM "{CATALOG_TABLE}"')
+            conn.execute(f'''
+                INSERT INTO "{CATALOG_TABLE}" (code, name)
+                SELECT "{code_col}", MAX({name_expr}) FROM "{table}"
+                WHERE "{code_col}" IS NOT NULL
+                GROUP BY "{code_col}"''')
+
+            # 触发器：新增/改名时同步目录，某代码的行被删光时移除目录项
+            conn.execute(f'DROP TRIGGER IF EXISTS "{CATALOG_TABLE}_ai"')
+            conn.execute(f'''
+                CREATE TRIGGER "{CATALOG_TABLE}_ai" AFTER INSERT ON "{table}"
+                WHEN NEW."{code_col}" IS NOT NULL
+                BEGIN
+                    INSERT INTO "{CATALOG_TABLE}" (code, name) VALUES (NEW."{code_col}", {new_name})
+                    ON CONFLICT(code) DO UPDATE SET name = COALESCE(excluded.name, name);
+                END''')
+            conn.execute(f'DROP TRIGGER IF EXISTS "{CATALOG_TABLE}_au"')
+            if name_col:
+                conn.execute(f'''
+                    CREATE TRIGGER "{CATALOG_TABLE}_au" AFTER UPDATE OF "{name_col}" ON "{table}"
+                    WHEN NEW."{name_col}" IS NOT NULL
+                    BEGIN
+                        UPDATE "{CATALOG_TABLE}" SET name = NEW."{name_col}" WHERE code = NEW."{code_col}";
+                    END''')
+            conn.execute(f'DROP TRIGGER IF EXISTS "{CATALOG_TABLE}_ad"')
+            conn.execute(f'''
+                CREATE TRIGGER "{CATALOG_TABLE}_ad" AFTER DELETE ON "{table}"
+                WHEN NOT EXISTS (SELECT 1 FROM "{table}" WHERE "{code_col}" = OLD."{code_col}")
+                BEGIN
+                    DELETE FROM "{CATALOG_TABLE}" WHERE code = OLD."{code_col}";
+                END''')
+        return conn.execute(f'SELECT COUNT(*) FROM "{CATALOG_TABLE}"').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _yyyymmdd_to_datetime(values: np.ndarray) -> np.ndarray:
+    """
+    把 yyyymmdd 整数向量化地转换为 datetime64[D]，非法日期为 NaT
+    """
+    valid = ~np.isnan(values)
+    ints = np.where(valid, values, 19700101).astype(np.int64)
+    year = ints // 10000
+    month = ints // 100 % 100
+    day = ints % 100
+    valid &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    month_start = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    valid &= day <= days_in_month
+    result = month_start.astype('datetime64[D]') + (day - 1)
+    result[~valid] = np.datetime64('NaT')
+    return result
+
+
+def _parse_trade_date(s_raw: pd.Series, date_format: Optional[Tuple[str, str]] = None) -> pd.Series:
+    """
+    把原始日期列解析为 datetime64（精确到日）。
+    date_format 为 _detect_date_format 识别出的表级格式，已知时走向量化快速路径。
+    """
+    if date_format is not None:
+        kind, fmt = date_format
+        if kind == 'int':
+            # yyyymmdd 整数：纯整数运算，不经过字符串
+            values = pd.to_numeric(s_raw, errors='coerce').to_numpy(dtype=np.float64)
+            return pd.Series(_yyyymmdd_to_datetime(values).astype('datetime64[s]'), index=s_raw.index)
+        # 文本日期按表级固定格式解析（只取日期部分），比逐个推断格式快得多
+        s_text = s_raw if fmt == '%Y%m%d' else s_raw.astype(str).str.slice(0, 10)
+        s_dt = pd.to_datetime(s_text, format=fmt, errors='coerce')
+        if s_dt.notna().sum() == s_raw.notna().sum():
+            return s_dt
+
     # 尝试把所有分隔符去掉，以识别 yyyymmdd
-    s_raw = df[date_col]
     s_str = s_raw.astype(str).str.replace('-', '', regex=False).str.replace('/', '', regex=False)
     # 优先按 yyyymmdd 解析
     s_dt = pd.to_datetime(s_str, format='%Y%m%d', errors='coerce')
     # 对没解析到的，再用自动解析
     mask = s_dt.isna()
     if mask.any():
-        s_dt2 = pd.to_datetime(s_raw, errors='coerce', infer_datetime_format=True)
+        s_dt2 = pd.to_datetime(s_raw, errors='coerce').dt.normalize()
         s_dt = s_dt.where(~mask, s_dt2)
-    # 最终格式化为 YYYY/MM/DD
-    return s_dt.dt.strftime('%Y/%m/%d')
+    return s_dt
+
+
+def normalize_trade_dates(values: Any, date_format: Optional[Tuple[str, str]] = None) -> pd.Series:
+    """
+    把任意常见格式（yyyymmdd 整数/文本、yyyy-mm-dd、yyyy/mm/dd）的日期解析为 datetime64，无法解析为 NaT。
+    供导入等外部数据使用，与读取数据库时的解析规则一致。
+    :param date_format: 已知的存储格式（get_date_format 的返回值），给出时走与读库相同的快速路径
+    """
+    return _parse_trade_date(pd.Series(values), date_format)
+
+
+def format_trade_dates(dates: Any) -> List[Optional[str]]:
+    """
+    把 datetime64 日期序列格式化为 'YYYY/MM/DD' 字符串列表，只在输出 JSON/HTML 时调用
+    """
+    values = np.asarray(dates, dtype='datetime64[D]')
+    if not len(values):
+        return []
+    result = np.char.replace(np.datetime_as_string(values, unit='D'), '-', '/').astype(object)
+    result[np.isnat(values)] = None
+    return result.tolist()
+
+
+def _db_change_stamp() -> Tuple[int, ...]:
+    # 数据库文件及 WAL 文件的 (inode, 修改时间, 大小)；任何写入都会改变其中之一
+    stamp: List[int] = []
+    for path in (DB_PATH, DB_PATH + '-wal'):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stamp.extend((0, 0, 0))
+            continue
+        stamp.extend((st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+def get_db_mtime() -> float:
+    """数据库最近一次写入的时间戳（含 WAL 文件），用作 HTTP Last-Modified"""
+    mtimes = []
+    for path in (DB_PATH, DB_PATH + '-wal'):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except FileNotFoundError:
+            pass
+    if not mtimes:
+        raise FileNotFoundError(f'数据库文件未找到: {DB_PATH}')
+    return max(mtimes)
+
+
+REVISION_TABLE = 'data_revision'
+
+
+def bump_data_revision(conn: sqlite3.Connection, code: str) -> None:
+    """
+    把某只股票的写入计数加一。改写已有数据（如重新导入修正过的文件）时行数和最大日期可能都不变，
+    在写入的同一事务中调用，get_data_version 随之变化，各级缓存与 ETag 自动失效。
+    """
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{REVISION_TABLE}" (
+            code TEXT PRIMARY KEY,
+            revision INTEGER NOT NULL
+        ) WITHOUT ROWID''')
+    conn.execute(f'INSERT INTO "{REVISION_TABLE}" (code, revision) VALUES (?, 1) '
+                 f'ON CONFLICT(code) DO UPDATE SET revision = revision + 1', [code])
 
 
-def read_stock_data(code: str) -> pd.DataFrame:
+def _query_versions(conn: sqlite3.Connection, codes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    一批股票的数据版本（格式见 get_data_version），一条查询；表中没有数据的代码不出现在结果里。
+    单只与批量读取共用这里的查询，版本的组成只在一处定义。
+    """
+    table, colmap = get_table_and_columns(conn)
+    code_col = colmap['code']
+    date_col = colmap['date']
+    placeholders = ', '.join(['?'] * len(codes))
+    sql = (f'SELECT "{code_col}" AS code, COUNT(*) AS n, MAX("{date_col}") AS max_date FROM "{table}" '
+           f'WHERE "{code_col}" IN ({placeholders}) GROUP BY "{code_col}"')
+    if _schema_catalog.has_table(conn, REVISION_TABLE):
+        sql = (f'SELECT v.code, v.n, v.max_date, r.revision FROM ({sql}) v '
+               f'LEFT JOIN "{REVISION_TABLE}" r ON r.code = v.code')
+    else:
+        sql = f'SELECT code, n, max_date, NULL FROM ({sql})'
+    versions = {}
+    for code, rows, max_date, revision in conn.execute(sql, list(codes)):
+        version = {'rows': rows, 'max_date': None if max_date is None else str(max_date)}
+        if revision is not None:
+            version['revision'] = revision
+        versions[code] = version
+    return versions
+
+
+# 代码 -> (数据库变更标记, 数据版本)；数据库文件没有变化时直接返回，不查库
+_version_memo: Dict[str, Tuple[Tuple[int, ...], Dict[str, Any]]] = {}
+
+
+def get_data_version(code: str, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """
+    单只股票源数据的版本：行数、原始格式的最大日期，以及改写过数据时的写入计数（见 bump_data_revision），
+    用于判断各级缓存是否过期。
+    有 (code, date) 索引时只需一次索引查找；不传 conn 时按数据库文件的变更标记记忆结果，
+    文件未被写过就只需一次 stat。
+    """
+    stamp = None
+    if conn is None:
+        stamp = _db_change_stamp()
+        memo = _version_memo.get(code)
+        if memo is not None and memo[0] == stamp:
+            return dict(memo[1])
+        conn = _get_conn()
+    version = _query_versions(conn, [code]).get(code, {'rows': 0, 'max_date': None})
+    if stamp is not None:
+        _version_memo[code] = (stamp, version)
+    return dict(version)
+
+
+def _frame_from_columns(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    # 日期与数值列都直接引用内存映射数组，不做拷贝
+    data = {'trade_date': arrays['trade_date']}
+    for field in ['open', 'high', 'low', 'close', 'vol']:
+        if field in arrays:
+            data[field] = arrays[field]
+    return pd.DataFrame(data, copy=False)
+
+
+def _columns_from_frame(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    arrays = {'trade_date': df['trade_date'].to_numpy(dtype='datetime64[s]')}
+    for field in ['open', 'high', 'low', 'close', 'vol']:
+        if field in df.columns:
+            arrays[field] = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=np.float64)
+    return arrays
+
+
+def _to_day(value: Any) -> Optional[pd.Timestamp]:
+    if value is None or value == '':
+        return None
+    return pd.Timestamp(value).normalize()
+
+
+def _date_range_clause(date_col: str, date_format: Optional[Tuple[str, str]],
+                       start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> Optional[Tuple[str, List[Any]]]:
+    """
+    把 [start, end] 转换为原始日期列上的 SQL 条件（end 用次日做开区间，兼容带时间的日期）。
+    日期格式未识别时返回 None，由调用方在解析后过滤。
+    """
+    if date_format is None:
+        return None
+    kind, fmt = date_format
+
+    def bound(ts: pd.Timestamp) -> Any:
+        return int(ts.strftime('%Y%m%d')) if kind == 'int' else ts.strftime(fmt)
+
+    clauses: List[str] = []
+    params: List[Any] = []
+    if start is not None:
+        clauses.append(f'"{date_col}" >= ?')
+        params.append(bound(start))
+    if end is not None:
+        clauses.append(f'"{date_col}" < ?')
+        params.append(bound(end + pd.Timedelta(days=1)))
+    return ''.join(f' AND {c}' for c in clauses), params
+
+
+def _slice_columns(arrays: Dict[str, np.ndarray], start: Optional[pd.Timestamp],
+                   end: Optional[pd.Timestamp], last_n: Optional[int]) -> Dict[str, np.ndarray]:
+    # 缓存中的日期已升序（NaT 排在最后），按二分查找切片，结果仍是内存映射视图
+    dates = arrays['trade_date']
+    lo = 0
+    hi = len(dates) - int(np.isnat(dates).sum())
+    if start is not None:
+        lo = int(np.searchsorted(dates[:hi], np.datetime64(start, 's'), side='left'))
+    if end is not None:
+        hi = int(np.searchsorted(dates[:hi], np.datetime64(end + pd.Timedelta(days=1), 's'), side='left'))
+    if last_n is not None:
+        lo = max(lo, hi - last_n)
+    return {k: v[lo:hi] for k, v in arrays.items()}
+
+
+def read_stock_data(code: str, start: Optional[Any] = None, end: Optional[Any] = None,
+                    last_n: Optional[int] = None) -> pd.DataFrame:
     """
     读取单只股票的历史K线数据，返回包含列：
-    trade_date(YYYY/MM/DD), open, high, low, close, 以及可选的 vol
+    trade_date(datetime64，精确到日), open, high, low, close, 以及可选的 vol
+    日期只在输出时用 format_trade_dates 转为字符串
+    start/end 限定日期范围（含两端），last_n 只取范围内最近的 N 根K线；
+    这些条件会下推到 SQL 的原始日期列上。
+    启用列式缓存时，源数据未变化则直接从内存映射文件加载。
     """
+    start = _to_day(start)
+    end = _to_day(end)
+    bounded = start is not None or end is not None or last_n is not None
+
     conn = _get_conn()
-    try:
-        table, colmap = _find_table_and_columns(conn)
-        code_col = colmap['code']
-        date_col = colmap['date']
-        cols = [colmap['open'], colmap['high'], colmap['low'], colmap['close'], date_col]
-        if colmap['vol']:
-            cols.append(colmap['vol'])
-
-        sel_cols = ', '.join([f'"{c}"' for c in cols])
-        sql = f'SELECT {sel_cols} FROM "{table}" WHERE "{code_col}" = ?'
-        df = pd.read_sql_query(sql, conn, params=[code])
-
-        # 统一列名
-        df = df.rename(columns={
-            colmap['open']: 'open',
-            colmap['high']: 'high',
-            colmap['low']: 'low',
-            colmap['close']: 'close',
-        })
-        if colmap['vol'] and colmap['vol'] in df.columns:
-            df = df.rename(columns={colmap['vol']: 'vol'})
-
-        # 统一 trade_date
-        df['trade_date'] = _format_trade_date(df, date_col)
-
-        # 排序
-        df = df.sort_values('trade_date').reset_index(drop=True)
-        return df[['trade_date', 'open', 'high', 'low', 'close'] + (['vol'] if 'vol' in df.columns else [])]
-    finally:
-        conn.close()
+    version = None
+    if column_cache.ENABLED:
+        version = get_data_version(code, conn)
+        cached = column_cache.load(code, version)
+        if cached is not None:
+            if bounded:
+                cached = _slice_columns(cached, start, end, last_n)
+            return _frame_from_columns(cached)
+
+    table, colmap = get_table_and_columns(conn)
+    code_col = colmap['code']
+    date_col = colmap['date']
+    cols = [colmap['open'], colmap['high'], colmap['low'], colmap['close'], date_col]
+    if colmap['vol']:
+        cols.append(colmap['vol'])
+
+    sel_cols = ', '.join([f'"{c}"' for c in cols])
+    sql = f'SELECT {sel_cols} FROM "{table}" WHERE "{code_col}" = ?'
+    params: List[Any] = [code]
+    date_format = _schema_catalog.date_format(conn)
+    range_clause = _date_range_clause(date_col, date_format, start, end) if bounded else None
+    if range_clause is not None:
+        sql += range_clause[0]
+        params += range_clause[1]
+        if last_n is not None:
+            sql += f' ORDER BY "{date_col}" DESC LIMIT ?'
+            params.append(int(last_n))
+    df = pd.read_sql_query(sql, conn, params=params)
+
+    # 统一列名
+    df = df.rename(columns={
+        colmap['open']: 'open',
+        colmap['high']: 'high',
+        colmap['low']: 'low',
+        colmap['close']: 'close',
+    })
+    if colmap['vol'] and colmap['vol'] in df.columns:
+        df = df.rename(columns={colmap['vol']: 'vol'})
+
+    # 统一 trade_date；日期格式无法下推时在解析后过滤
+    parsed = _parse_trade_date(df[date_col], date_format)
+    if bounded and range_clause is None:
+        mask = parsed.notna()
+        if start is not None:
+            mask &= parsed >= start
+        if end is not None:
+            mask &= parsed < end + pd.Timedelta(days=1)
+        df = df[mask]
+        parsed = parsed[mask]
+    df['trade_date'] = parsed.to_numpy(dtype='datetime64[s]')
+
+    # 排序
+    df = df.sort_values('trade_date').reset_index(drop=True)
+    if last_n is not None and range_clause is None:
+        df = df.tail(last_n).reset_index(drop=True)
+    df = df[['trade_date', 'open', 'high', 'low', 'close'] + (['vol'] if 'vol' in df.columns else [])]
+
+    # 首次完整读取时懒构建列式缓存
+    if version is not None and version['rows'] and not bounded:
+        column_cache.store(code, version, _columns_from_frame(df))
+    return df
+
+
+class StockPanel(NamedTuple):
+    """
+    多只股票对齐后的面板数据
+    dates: 所有股票交易日的并集（datetime64，升序）
+    codes: 列顺序对应的股票代码；code_index: 代码 -> 列号
+    data: 字段名 -> 二维数组 (日期 × 股票)，缺失处为 NaN
+    """
+    dates: np.ndarray
+    codes: List[str]
+    code_index: Dict[str, int]
+    data: Dict[str, np.ndarray]
+
+
+# 单条 SQL 中 IN (...) 的最大参数个数，低于 SQLite 默认的变量上限
+PANEL_CHUNK_SIZE = 500
+
+
+def _chunks(items: Sequence[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def read_stock_panel(codes: Sequence[str],
+                     start: Optional[Any] = None,
+                     end: Optional[Any] = None,
+                     fields: Sequence[str] = ('open', 'high', 'low', 'close', 'vol')) -> StockPanel:
+    """
+    批量读取多只股票，按交易日对齐成 (日期 × 股票) 的二维数组。
+    每批代码只发一条版本查询和一条数据查询；列式缓存有效的股票直接从缓存加载。
+    :param codes: 股票代码列表（重复代码只保留一列）
+    :param start: 起始日期（含），任意 pandas 可解析的日期，会下推到 SQL
+    :param end: 结束日期（含）
+    :param fields: 需要的字段，取自 open/high/low/close/vol
+    """
+    codes = list(dict.fromkeys(codes))
+    code_index = {c: i for i, c in enumerate(codes)}
+    start = _to_day(start)
+    end = _to_day(end)
+    conn = _get_conn()
+    table, colmap = get_table_and_columns(conn)
+    fields = [f for f in fields if colmap.get(f)]
+    code_col = colmap['code']
+    date_col = colmap['date']
+    date_format = _schema_catalog.date_format(conn)
+    range_clause = _date_range_clause(date_col, date_format, start, end) or ('', [])
+
+    # 每个片段：(列号数组, 日期数组, {字段: 值数组})
+    pieces: List[Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]] = []
+    for chunk in _chunks(codes, PANEL_CHUNK_SIZE):
+        to_query = list(chunk)
+
+        if column_cache.ENABLED:
+            # 与 get_data_version 相同的版本（含写入计数），否则改写过的数据仍会命中旧缓存
+            versions = _query_versions(conn, chunk)
+            to_query = []
+            for code in chunk:
+                if code not in versions:
+                    continue
+                cached = column_cache.load(code, versions[code])
+                if cached is None:
+                    to_query.append(code)
+                    continue
+                dates = cached['trade_date']
+                cols = np.full(len(dates), code_index[code])
+                pieces.append((cols, dates, {f: cached[f] for f in fields}))
+
+        if not to_query:
+            continue
+        placeholders = ', '.join(['?'] * len(to_query))
+        sel_cols = ', '.join(f'"{colmap[f]}" AS "{f}"' for f in fields)
+        sql = (f'SELECT "{code_col}" AS code, "{date_col}", {sel_cols} FROM "{table}" '
+               f'WHERE "{code_col}" IN ({placeholders}){range_clause[0]}')
+        df = pd.read_sql_query(sql, conn, params=to_query + range_clause[1])
+        dates = _parse_trade_date(df[date_col], date_format).to_numpy(dtype='datetime64[s]')
+        cols = df['code'].map(code_index).to_numpy()
+        pieces.append((cols, dates, {f: pd.to_numeric(df[f], errors='coerce').to_numpy(dtype=np.float64)
+                                     for f in fields}))
+
+    # 日期范围过滤后取并集，再用 searchsorted 把每行放到对应位置
+    lo = np.datetime64(start, 's') if start is not None else None
+    hi = np.datetime64(end + pd.Timedelta(days=1), 's') if end is not None else None
+    filtered = []
+    for cols, dates, values in pieces:
+        mask = ~np.isnat(dates)
+        if lo is not None:
+            mask &= dates >= lo
+        if hi is not None:
+            mask &= dates < hi
+        filtered.append((cols[mask], dates[mask], {f: v[mask] for f, v in values.items()}))
+
+    if filtered:
+        all_dates = np.unique(np.concatenate([d for _, d, _ in filtered]))
+    else:
+        all_dates = np.array([], dtype='datetime64[s]')
+    data = {f: np.full((len(all_dates), len(codes)), np.nan) for f in fields}
+    for cols, dates, values in filtered:
+        rows = np.searchsorted(all_dates, dates)
+        for f in fields:
+            data[f][rows, cols] = values[f]
+
+    return StockPanel(all_dates, codes, code_index, data)
 
 
 def get_stock_list() -> List[Dict[str, str]]:
@@ -170,23 +879,24 @@ def get_stock_list() -> List[Dict[str, str]]:
     如果不存在名称列，则使用 code 作为 name。
     """
     conn = _get_conn()
-    try:
-        table, colmap = _find_table_and_columns(conn)
-        code_col = colmap['code']
-        name_col = colmap['name']
-
-        if name_col:
-            sql = f'SELECT DISTINCT "{code_col}" AS code, "{name_col}" AS name FROM "{table}" ORDER BY code'
-            df = pd.read_sql_query(sql, conn)
-            df['name'] = df['name'].fillna(df['code'])
-        else:
-            sql = f'SELECT DISTINCT "{code_col}" AS code FROM "{table}" ORDER BY code'
-            df = pd.read_sql_query(sql, conn)
-            df['name'] = df['code']
-
-        return [{'code': r['code'], 'name': r['name']} for _, r in df.iterrows()]
-    finally:
-        conn.close()
+    if _schema_catalog.has_table(conn, CATALOG_TABLE):
+        sql = f'SELECT code, COALESCE(name, code) AS name FROM "{CATALOG_TABLE}" ORDER BY code'
+        return [{'code': code, 'name': name} for code, name in conn.execute(sql).fetchall()]
+
+    table, colmap = get_table_and_columns(conn)
+    code_col = colmap['code']
+    name_col = colmap['name']
+
+    if name_col:
+        sql = f'SELECT DISTINCT "{code_col}" AS code, "{name_col}" AS name FROM "{table}" ORDER BY code'
+        df = pd.read_sql_query(sql, conn)
+        df['name'] = df['name'].fillna(df['code'])
+    else:
+        sql = f'SELECT DISTINCT "{code_col}" AS code FROM "{table}" ORDER BY code'
+        df = pd.read_sql_query(sql, conn)
+        df['name'] = df['code']
+
+    return [{'code': r['code'], 'name': r['name']} for _, r in df.iterrows()]
 
 
 def get_stock_name(code: str) -> str:
@@ -194,16 +904,37 @@ def get_stock_name(code: str) -> str:
     获取单个股票名称；若不存在名称列或查不到，返回 code
     """
     conn = _get_conn()
-    try:
-        table, colmap = _find_table_and_columns(conn)
-        code_col = colmap['code']
-        name_col = colmap['name']
-        if not name_col:
-            return code
-        sql = f'SELECT "{name_col}" AS name FROM "{table}" WHERE "{code_col}" = ? LIMIT 1'
-        df = pd.read_sql_query(sql, conn, params=[code])
-        if df.empty or pd.isna(df.loc[0, 'name']):
-            return code
-        return str(df.loc[0, 'name'])
-    finally:
-        conn.close()
\ No newline at end of file
+    if _schema_catalog.has_table(conn, CATALOG_TABLE):
+        row = conn.execute(f'SELECT name FROM "{CATALOG_TABLE}" WHERE code = ?', [code]).fetchone()
+        return str(row[0]) if row and row[0] is not None else code
+
+    table, colmap = get_table_and_columns(conn)
+    code_col = colmap['code']
+    name_col = colmap['name']
+    if not name_col:
+        return code
+    sql = f'SELECT "{name_col}" AS name FROM "{table}" WHERE "{code_col}" = ? LIMIT 1'
+    df = pd.read_sql_query(sql, conn, params=[code])
+    if df.empty or pd.isna(df.loc[0, 'name']):
+        return code
+    return str(df.loc[0, 'name'])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='stock_data.db 索引与目录表维护')
+    parser.add_argument('command', choices=['advise', 'install'],
+                        help='advise: 只列出缺失的索引；install: 创建索引并重建 stock_catalog')
+    parser.add_argument('--no-covering', action='store_true', help='只建 (code, date) 两列索引')
+    args = parser.parse_args()
+
+    covering = not args.no_covering
+    if args.command == 'advise':
+        missing = advise_indexes(covering=covering)
+        print('\n'.join(missing) if missing else '索引已齐全')
+        print(f'{CATALOG_TABLE}: ' + ('已存在' if _schema_catalog.has_table(_get_conn(), CATALOG_TABLE) else '缺失'))
+    else:
+        for sql in ensure_indexes(covering=covering):
+            print(f'已执行: {sql}')
+        print(f'{CATALOG_TABLE} 已同步 {refresh_stock_catalog()} 只股票')
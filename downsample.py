@@ -0,0 +1,73 @@
+import numpy as np
+from typing import Dict
+
+from resample import reduce_bars
+
+# 长区间图表的服务端降采样：K线按桶合成（开/高/低/收/量，保留极值），
+# 指标线用 LTTB（Largest-Triangle-Three-Buckets）在同一组桶上选点，保证横轴对齐
+
+MIN_POINTS = 3
+
+
+def bucket_starts(n: int, points: int) -> np.ndarray:
+    """
+    把 n 根K线划分为 points 个桶，返回各桶起点。
+    首尾两根各自成桶（LTTB 固定保留端点），中间部分等分；n <= points 时每根一个桶。
+    """
+    if points >= n:
+        return np.arange(n, dtype=np.int64)
+    points = max(points, MIN_POINTS)
+    # 中间 points-2 个桶的边界：1 .. n-1，间距 >= 1，取整后严格递增
+    inner = np.floor(np.linspace(1, n - 1, points - 1)).astype(np.int64)
+    return np.concatenate(([0], inner))
+
+
+def downsample_ohlcv(arrays: Dict[str, np.ndarray], starts: np.ndarray) -> Dict[str, np.ndarray]:
+    """按桶合成K线：开盘取首根、最高/最低取极值、收盘与日期取末根、成交量求和"""
+    return reduce_bars(arrays, starts)
+
+
+def lttb_indices(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    LTTB：每个桶选出与「上一个选中点、下一个桶均值点」构成三角形面积最大的点。
+    :param values: 不含 NaN 的序列，横坐标取下标；二维 (n, k) 时 k 条序列同时计算
+    :param starts: bucket_starts 的结果，首尾桶只含端点
+    :return: 每个桶选中点的下标，形状 (m,) 或 (m, k)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    n, k = values.shape
+    m = len(starts)
+    if m >= n:
+        selected = np.repeat(np.arange(n, dtype=np.int64)[:, None], k, axis=1)
+        return selected[:, 0] if squeeze else selected
+    ends = np.append(starts[1:], n)
+    # 各桶均值点，用前缀和一次算出
+    csum = np.vstack((np.zeros((1, k)), np.cumsum(values, axis=0)))
+    avg_x = (starts + ends - 1) / 2.0
+    avg_y = (csum[ends] - csum[starts]) / (ends - starts)[:, None]
+
+    selected = np.empty((m, k), dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    cols = np.arange(k)
+    prev = np.zeros(k, dtype=np.int64)
+    for b in range(1, m - 1):
+        s, e = starts[b], ends[b]
+        py = values[prev, cols]
+        xs = np.arange(s, e)[:, None]
+        area = np.abs((prev - avg_x[b + 1]) * (values[s:e] - py) - (prev - xs) * (avg_y[b + 1] - py))
+        prev = s + area.argmax(axis=0)
+        selected[b] = prev
+    return selected[:, 0] if squeeze else selected
+
+
+def lttb(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """按 LTTB 选出的点取值，形状同 lttb_indices"""
+    values = np.asarray(values, dtype=np.float64)
+    idx = lttb_indices(values, starts)
+    if values.ndim == 1:
+        return values[idx]
+    return np.take_along_axis(values, idx, axis=0)
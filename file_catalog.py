@@ -0,0 +1,186 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+# 股票文件目录（stock-data/<代码>_<名称>.xlsx）的目录索引与解析结果缓存：
+# - 代码 -> (路径, 名称, mtime, 大小) 的索引只在首次使用时扫描目录，之后按目录 mtime 轮询刷新
+#   （最多每 POLL_INTERVAL 秒 stat 一次目录），增删改名文件都会改变目录 mtime
+# - 解析后的 DataFrame 按 (路径, 解析函数, 文件 mtime, 大小) 缓存，文件内容改变后自动重新解析
+
+STOCK_DIR = 'stock-data'
+FILE_SUFFIXES = ('.xlsx', '.xls', '.csv')
+POLL_INTERVAL = float(os.environ.get('STOCK_FILE_CATALOG_POLL', '2'))
+FRAME_CACHE_SIZE = int(os.environ.get('STOCK_FRAME_CACHE_SIZE', '64'))
+
+_FILENAME_RE = re.compile(r'^(?P<code>[^_]+)_(?P<name>.+)$')
+
+
+class FileEntry(NamedTuple):
+    code: str
+    name: str
+    path: str
+    mtime_ns: int
+    size: int
+
+
+def parse_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    '<代码>_<名称>.xlsx' -> (代码, 名称)；不是股票文件（扩展名不对、Excel 临时文件等）时返回 None
+    """
+    base, ext = os.path.splitext(os.path.basename(filename))
+    if ext.lower() not in FILE_SUFFIXES or base.startswith('~$'):
+        return None
+    m = _FILENAME_RE.match(base)
+    return (m.group('code'), m.group('name')) if m else None
+
+
+class FileCatalog:
+    """一个股票文件目录的索引"""
+
+    def __init__(self, directory: str = STOCK_DIR, poll_interval: float = POLL_INTERVAL):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[str, FileEntry] = {}
+        self._codes: List[str] = []          # 排好序的代码，用于前缀查找
+        self._dir_mtime: Optional[int] = None
+        self._checked = 0.0
+        self.scans = 0
+
+    def _scan(self) -> None:
+        entries: Dict[str, FileEntry] = {}
+        with os.scandir(self.directory) as it:
+            for item in it:
+                parsed = parse_filename(item.name)
+                if parsed is None or not item.is_file():
+                    continue
+                code, name = parsed
+                st = item.stat()
+                entry = FileEntry(code, name, item.path, st.st_mtime_ns, st.st_size)
+                # 同一代码有多个文件时取文件名排序最前的，结果与目录顺序无关
+                if code not in entries or item.path < entries[code].path:
+                    entries[code] = entry
+        self._entries = entries
+        self._codes = sorted(entries)
+        self.scans += 1
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._dir_mtime is not None and now - self._checked < self.poll_interval:
+            return
+        with self._lock:
+            if self._dir_mtime is not None and now - self._checked < self.poll_interval:
+                return
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except FileNotFoundError:
+                self._entries, self._codes, self._dir_mtime = {}, [], None
+                return
+            if mtime != self._dir_mtime:
+                self._scan()
+                self._dir_mtime = mtime
+            self._checked = now
+
+    def get(self, code: str) -> Optional[FileEntry]:
+        """
+        按代码查找文件；没有完全匹配时与原先的 startswith 查找一致，返回代码以 code 开头的第一个文件
+        """
+        self._refresh()
+        entry = self._entries.get(code)
+        if entry is not None:
+            return entry
+        codes = self._codes
+        lo, hi = 0, len(codes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if codes[mid] < code:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(codes) and codes[lo].startswith(code):
+            return self._entries[codes[lo]]
+        return None
+
+    def entries(self) -> List[FileEntry]:
+        """全部股票文件（按代码排序）"""
+        self._refresh()
+        entries = self._entries
+        return [entries[c] for c in self._codes]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._dir_mtime = None
+
+
+_catalogs: Dict[str, FileCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(directory: str = STOCK_DIR) -> FileCatalog:
+    """进程内共享的目录索引"""
+    key = os.path.abspath(directory)
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = FileCatalog(directory)
+        return _catalogs[key]
+
+
+class _FrameCache:
+    """解析结果的 LRU 缓存（按条目数限制）"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data: 'OrderedDict[Tuple, pd.DataFrame]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            frame = self._data.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key: Tuple, frame: pd.DataFrame) -> None:
+        with self._lock:
+            # 同一文件的旧版本不会再被命中，直接移除
+            for old in [k for k in self._data if k[:2] == key[:2]]:
+                del self._data[old]
+            self._data[key] = frame
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._data), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_frames = _FrameCache(FRAME_CACHE_SIZE)
+
+
+def load_frame(path: str, parser: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+    """
+    用 parser 解析 path 并缓存结果；文件未修改时直接返回缓存（副本，调用方可以随意修改）
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), f'{parser.__module__}.{parser.__qualname__}', st.st_mtime_ns, st.st_size)
+    frame = _frames.get(key)
+    if frame is None:
+        frame = parser(path)
+        _frames.put(key, frame)
+    return frame.copy()
+
+
+def get_stats():
+    """解析结果缓存的统计"""
+    return _frames.info()
@@ -0,0 +1,132 @@
+import os
+import gzip
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from flask import current_app, request
+
+from payload_cache import BytesLRU
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只提供 gzip
+    brotli = None
+
+# HTTP 缓存协商与响应压缩：
+# - 路由在做任何查询/计算之前用 not_modified() 判断能否直接返回 304
+# - compress_response 作为 after_request 压缩较大的文本响应，带 ETag 的响应复用缓存的压缩结果
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+}
+
+# (ETag, 编码) -> 压缩后的正文
+_variants = BytesLRU(int(float(os.environ.get('STOCK_HTTP_VARIANT_CACHE_MB', '32')) * 1024 * 1024), 6 * 3600)
+
+
+def make_etag(*parts: Any) -> str:
+    """由若干参数（代码、数据版本、请求参数等）生成 ETag"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+
+def template_version(name: str) -> float:
+    """模板文件的修改时间，页面 ETag 带上它，模板更新后浏览器缓存随之失效"""
+    app = current_app
+    return os.path.getmtime(os.path.join(app.root_path, app.template_folder, name))
+
+
+def _http_date(timestamp: float) -> datetime:
+    # HTTP 日期只精确到秒
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+
+
+def set_validators(response, etag: str, last_modified: Optional[float] = None):
+    """给响应加上 ETag / Last-Modified，并要求浏览器每次使用前先验证"""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def not_modified(etag: str, last_modified: Optional[float] = None):
+    """
+    请求的 If-None-Match（优先）或 If-Modified-Since 与当前版本一致时返回 304 响应，否则返回 None。
+    """
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since:
+        matched = request.if_modified_since >= _http_date(last_modified)
+    else:
+        matched = False
+    if not matched:
+        return None
+    return set_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def _choose_encoding() -> Optional[str]:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response):
+    """
+    after_request：按 Accept-Encoding 压缩较大的 JSON/HTML 等文本响应。
+    带 ETag 的响应内容由 ETag 唯一确定，压缩结果按 (ETag, 编码) 缓存，重复访问不再压缩。
+    """
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    etag, _ = response.get_etag()
+    if etag:
+        key = (etag, encoding)
+        data = _variants.get(key, None)
+        if data is None:
+            data = compress(body, encoding)
+            _variants.put(key, None, data)
+    else:
+        data = compress(body, encoding)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_http_cache(app) -> None:
+    """注册响应压缩"""
+    app.after_request(compress_response)
+
+
+def get_stats():
+    """压缩结果缓存的统计"""
+    return dict(_variants.info(), brotli=brotli is not None)
@@ -0,0 +1,438 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 增量指标引擎：每来一根新K线，用保存下来的状态 O(1) 更新全部指标，
+# 结果与 technical_indicators.process_stock_data_with_indicators 的整段计算一致
+# （EWM 按 pandas adjust=True 的递推逐步计算；滚动窗口用滑动和，每满一个窗口重新求和以消除累积误差）。
+
+STATE_DIR = os.path.join('stock-data', 'indicator-state')
+STATE_FORMAT = 1
+
+NAN = float('nan')
+
+MA_PERIODS = (5, 10, 20, 30, 60)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BB_PERIOD, BB_STD_DEV = 20, 2
+KDJ_PERIOD, KDJ_K_PERIOD, KDJ_D_PERIOD = 9, 3, 3
+
+# 输出列，与 process_stock_data_with_indicators 一致
+INDICATOR_FIELDS = (
+    [f'MA{n}' for n in MA_PERIODS]
+    + ['RSI', 'MACD', 'MACD_Signal', 'MACD_Histogram',
+       'BB_Upper', 'BB_Middle', 'BB_Lower', 'KDJ_K', 'KDJ_D', 'KDJ_J']
+)
+
+
+def _prep(x: float) -> float:
+    # pandas 的 rolling/ewm 计算前会把 ±inf 当作 NaN
+    return NAN if math.isinf(x) else x
+
+
+class _RollingWindow:
+    """
+    固定窗口的滑动和与平方和，对应 rolling(size).mean()/.std()（窗口内有 NaN 或不满时为 NaN）。
+    求和以窗口均值为偏移量以减小平方和相减的误差，每推入 size 个值按缓冲区重新求和一次。
+    连续 size 个相同值时与 pandas 一样直接返回该值（标准差为 0）。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: deque = deque(maxlen=size)
+        self.shift = 0.0
+        self.s1 = 0.0
+        self.s2 = 0.0
+        self.nans = 0
+        self.run = 0
+        self.pushes = 0
+
+    def push(self, x: float) -> None:
+        x = _prep(x)
+        if len(self.values) == self.size:
+            old = self.values[0]
+            if old != old:
+                self.nans -= 1
+            else:
+                d = old - self.shift
+                self.s1 -= d
+                self.s2 -= d * d
+        last = self.values[-1] if self.values else NAN
+        self.values.append(x)
+        if x != x:
+            self.nans += 1
+        else:
+            d = x - self.shift
+            self.s1 += d
+            self.s2 += d * d
+        self.run = self.run + 1 if x == last else 1
+        self.pushes += 1
+        if self.pushes >= self.size:
+            self._resum()
+
+    def _resum(self) -> None:
+        valid = [v for v in self.values if v == v]
+        self.shift = math.fsum(valid) / len(valid) if valid else 0.0
+        self.s1 = math.fsum(v - self.shift for v in valid)
+        self.s2 = math.fsum((v - self.shift) ** 2 for v in valid)
+        self.pushes = 0
+
+    def _ready(self) -> bool:
+        return len(self.values) == self.size and self.nans == 0
+
+    def mean(self) -> float:
+        if not self._ready():
+            return NAN
+        if self.run >= self.size:
+            return self.values[-1]
+        return self.shift + self.s1 / self.size
+
+    def std(self) -> float:
+        if not self._ready():
+            return NAN
+        if self.run >= self.size:
+            return 0.0
+        var = (self.s2 - self.s1 * self.s1 / self.size) / (self.size - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'size': self.size, 'values': list(self.values), 'shift': self.shift,
+                's1': self.s1, 's2': self.s2, 'nans': self.nans, 'run': self.run, 'pushes': self.pushes}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> '_RollingWindow':
+        obj = cls(d['size'])
+        obj.values.extend(d['values'])
+        for key in ('shift', 's1', 's2', 'nans', 'run', 'pushes'):
+            setattr(obj, key, d[key])
+        return obj
+
+
+class _RollingExtreme:
+    """单调队列维护的滚动最小/最大值，对应 rolling(size).min()/.max()"""
+
+    def __init__(self, size: int, is_max: bool):
+        self.size = size
+        self.is_max = is_max
+        self.queue: deque = deque()   # (序号, 值)，值单调
+        self.nan_positions: deque = deque()
+        self.count = 0
+
+    def push(self, x: float) -> float:
+        x = _prep(x)
+        i = self.count
+        self.count += 1
+        if x != x:
+            self.nan_positions.append(i)
+        else:
+            if self.is_max:
+                while self.queue and self.queue[-1][1] <= x:
+                    self.queue.pop()
+            else:
+                while self.queue and self.queue[-1][1] >= x:
+                    self.queue.pop()
+            self.queue.append((i, x))
+        first = i - self.size + 1
+        while self.queue and self.queue[0][0] < first:
+            self.queue.popleft()
+        while self.nan_positions and self.nan_positions[0] < first:
+            self.nan_positions.popleft()
+        if first < 0 or self.nan_positions:
+            return NAN
+        return self.queue[0][1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'size': self.size, 'is_max': self.is_max, 'queue': [list(p) for p in self.queue],
+                'nan_positions': list(self.nan_positions), 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> '_RollingExtreme':
+        obj = cls(d['size'], d['is_max'])
+        obj.queue.extend((int(i), v) for i, v in d['queue'])
+        obj.nan_positions.extend(d['nan_positions'])
+        obj.count = d['count']
+        return obj
+
+
+class _Ewm:
+    """
+    Series.ewm(...).mean() 的逐点版本（adjust=True, ignore_na=False），
+    与 pandas 内部的递推公式和运算顺序相同，结果逐位一致。
+    """
+
+    def __init__(self, com: float):
+        self.com = com
+        self.weighted = NAN
+        self.old_wt = 1.0
+
+    @classmethod
+    def from_span(cls, span: float) -> '_Ewm':
+        return cls((span - 1) / 2)
+
+    @classmethod
+    def from_alpha(cls, alpha: float) -> '_Ewm':
+        return cls((1 - alpha) / alpha)
+
+    def push(self, x: float) -> float:
+        x = _prep(x)
+        alpha = 1.0 / (1.0 + self.com)
+        weighted = self.weighted
+        if weighted == weighted:
+            self.old_wt *= 1.0 - alpha
+            if x == x:
+                if weighted != x:
+                    weighted = self.old_wt * weighted + x
+                    weighted /= self.old_wt + 1.0
+                self.old_wt += 1.0
+        elif x == x:
+            weighted = x
+        self.weighted = weighted
+        return weighted
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'com': self.com, 'weighted': self.weighted, 'old_wt': self.old_wt}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> '_Ewm':
+        obj = cls(d['com'])
+        obj.weighted = d['weighted']
+        obj.old_wt = d['old_wt']
+        return obj
+
+
+class IndicatorState:
+    """
+    单只股票的指标状态。update() 推入一根K线并返回该K线上的全部指标值。
+    状态可以序列化为 JSON（to_dict/from_dict），收盘后只需推入当天的新K线。
+    """
+
+    def __init__(self):
+        self.last_date: Optional[str] = None
+        self.last_close = NAN
+        self.bars = 0
+        self.ma = {n: _RollingWindow(n) for n in MA_PERIODS}
+        self.gain = _RollingWindow(RSI_PERIOD)
+        self.loss = _RollingWindow(RSI_PERIOD)
+        self.ema_fast = _Ewm.from_span(MACD_FAST)
+        self.ema_slow = _Ewm.from_span(MACD_SLOW)
+        self.macd_signal = _Ewm.from_span(MACD_SIGNAL)
+        self.lowest = _RollingExtreme(KDJ_PERIOD, is_max=False)
+        self.highest = _RollingExtreme(KDJ_PERIOD, is_max=True)
+        self.kdj_k = _Ewm.from_alpha(1 / KDJ_K_PERIOD)
+        self.kdj_d = _Ewm.from_alpha(1 / KDJ_D_PERIOD)
+        self.latest: Dict[str, float] = {}
+
+    def update(self, high: float, low: float, close: float, trade_date: Optional[str] = None) -> Dict[str, float]:
+        """推入一根K线（需按日期顺序），返回 INDICATOR_FIELDS 对应的指标值"""
+        high, low, close = float(high), float(low), float(close)
+        out: Dict[str, float] = {}
+
+        for n, window in self.ma.items():
+            window.push(close)
+            out[f'MA{n}'] = window.mean()
+
+        # RSI：涨跌幅为 NaN（首根K线）时按 0 计入，与 Series.where 的行为一致
+        delta = close - self.last_close
+        self.gain.push(delta if delta > 0 else 0.0)
+        self.loss.push(-delta if delta < 0 else -0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(self.gain.mean()) / np.float64(self.loss.mean())
+            out['RSI'] = float(100 - (100 / (1 + rs)))
+
+        macd = self.ema_fast.push(close) - self.ema_slow.push(close)
+        signal = self.macd_signal.push(macd)
+        out['MACD'] = macd
+        out['MACD_Signal'] = signal
+        out['MACD_Histogram'] = macd - signal
+
+        # 布林带与 MA20 共用同一个窗口的滑动和/平方和
+        bb = self.ma[BB_PERIOD]
+        middle = bb.mean()
+        std = bb.std()
+        out['BB_Upper'] = middle + std * BB_STD_DEV
+        out['BB_Middle'] = middle
+        out['BB_Lower'] = middle - std * BB_STD_DEV
+
+        lowest = self.lowest.push(low)
+        highest = self.highest.push(high)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsv = float((np.float64(close) - lowest) / (np.float64(highest) - lowest) * 100)
+        k = self.kdj_k.push(rsv)
+        d = self.kdj_d.push(k)
+        out['KDJ_K'] = k
+        out['KDJ_D'] = d
+        out['KDJ_J'] = 3 * k - 2 * d
+
+        self.last_close = close
+        self.last_date = trade_date
+        self.bars += 1
+        self.latest = out
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': STATE_FORMAT,
+            'last_date': self.last_date,
+            'last_close': self.last_close,
+            'bars': self.bars,
+            'ma': {str(n): w.to_dict() for n, w in self.ma.items()},
+            'gain': self.gain.to_dict(),
+            'loss': self.loss.to_dict(),
+            'ema_fast': self.ema_fast.to_dict(),
+            'ema_slow': self.ema_slow.to_dict(),
+            'macd_signal': self.macd_signal.to_dict(),
+            'lowest': self.lowest.to_dict(),
+            'highest': self.highest.to_dict(),
+            'kdj_k': self.kdj_k.to_dict(),
+            'kdj_d': self.kdj_d.to_dict(),
+            'latest': self.latest,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'IndicatorState':
+        if d.get('format') != STATE_FORMAT:
+            raise ValueError('指标状态格式版本不匹配')
+        obj = cls()
+        obj.last_date = d['last_date']
+        obj.last_close = d['last_close']
+        obj.bars = d['bars']
+        obj.ma = {int(n): _RollingWindow.from_dict(w) for n, w in d['ma'].items()}
+        obj.gain = _RollingWindow.from_dict(d['gain'])
+        obj.loss = _RollingWindow.from_dict(d['loss'])
+        for key in ('ema_fast', 'ema_slow', 'macd_signal', 'kdj_k', 'kdj_d'):
+            setattr(obj, key, _Ewm.from_dict(d[key]))
+        obj.lowest = _RollingExtreme.from_dict(d['lowest'])
+        obj.highest = _RollingExtreme.from_dict(d['highest'])
+        obj.latest = d.get('latest', {})
+        return obj
+
+
+def _date_key(value: Any) -> str:
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def apply_bars(state: IndicatorState, stock_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    把 stock_data 中的K线依次推入 state，返回每根K线的指标（列同 INDICATOR_FIELDS）。
+    :param stock_data: 含 trade_date/high/low/close，按日期升序
+    """
+    highs = pd.to_numeric(stock_data['high']).to_numpy(dtype=np.float64)
+    lows = pd.to_numeric(stock_data['low']).to_numpy(dtype=np.float64)
+    closes = pd.to_numeric(stock_data['close']).to_numpy(dtype=np.float64)
+    dates = [_date_key(d) for d in stock_data['trade_date']]
+    rows = [state.update(h, l, c, d) for h, l, c, d in zip(highs.tolist(), lows.tolist(), closes.tolist(), dates)]
+    return pd.DataFrame(rows, columns=INDICATOR_FIELDS, index=stock_data.index)
+
+
+def _state_path(code: str) -> str:
+    safe = re.sub(r'[^0-9A-Za-z._-]', '_', code)
+    return os.path.join(STATE_DIR, f'{safe}.json')
+
+
+def load_state(code: str) -> Optional[IndicatorState]:
+    """读取已保存的日K指标状态；没有或格式不符时返回 None"""
+    try:
+        with open(_state_path(code), encoding='utf-8') as f:
+            return IndicatorState.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_state(code: str, state: IndicatorState) -> None:
+    """保存指标状态（先写临时文件再替换）"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _state_path(code)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+def refresh_indicators(code: str) -> Optional[Dict[str, Any]]:
+    """
+    把数据库中比已保存状态更新的日K推入状态并保存，返回最新一根K线的指标。
+    没有保存过状态时从头计算一遍全部历史。
+    :return: {'trade_date', 'new_bars', 指标...}；数据库中没有该股票时返回 None
+    """
+    from db_utils import read_stock_data
+
+    state = load_state(code)
+    start = None
+    if state is not None and state.last_date:
+        start = pd.Timestamp(state.last_date) + pd.Timedelta(days=1)
+    else:
+        state = IndicatorState()
+
+    data = read_stock_data(code, start=start)
+    if data is None or data.empty:
+        if state.bars == 0:
+            return None
+        return dict(state.latest, trade_date=state.last_date, new_bars=0)
+    apply_bars(state, data)
+    save_state(code, state)
+    return dict(state.latest, trade_date=state.last_date, new_bars=len(data))
+
+
+def refresh_many(codes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    批量版 refresh_indicators：已有状态的股票用一次面板查询（按最早的状态日期下推）读出新K线，
+    逐只推入后保存；没有状态的股票逐只从头计算。
+    :return: 代码 -> 最新指标（同 refresh_indicators），数据库中没有的股票不在结果中
+    """
+    from db_utils import read_stock_panel
+
+    results: Dict[str, Dict[str, Any]] = {}
+    states: Dict[str, IndicatorState] = {}
+    for code in codes:
+        state = load_state(code)
+        if state is None or not state.last_date:
+            result = refresh_indicators(code)
+            if result is not None:
+                results[code] = result
+        else:
+            states[code] = state
+    if not states:
+        return results
+
+    start = min(pd.Timestamp(s.last_date) for s in states.values()) + pd.Timedelta(days=1)
+    panel = read_stock_panel(list(states), start=start, fields=('high', 'low', 'close'))
+    highs, lows, closes = panel.data['high'], panel.data['low'], panel.data['close']
+    for code, state in states.items():
+        col = panel.code_index[code]
+        # 面板里三个价格都缺失的日期表示该股票当天没有K线
+        mask = (panel.dates > np.datetime64(pd.Timestamp(state.last_date), 's')) & ~(
+            np.isnan(highs[:, col]) & np.isnan(lows[:, col]) & np.isnan(closes[:, col]))
+        rows = np.flatnonzero(mask)
+        for i in rows:
+            state.update(highs[i, col], lows[i, col], closes[i, col], _date_key(panel.dates[i]))
+        if len(rows):
+            save_state(code, state)
+        results[code] = dict(state.latest, trade_date=state.last_date, new_bars=len(rows))
+    return results
+
+
+def _main(argv: List[str]) -> int:
+    # python incremental_indicators.py refresh [code ...]   不指定代码时刷新全部股票
+    if not argv or argv[0] != 'refresh':
+        print('用法: python incremental_indicators.py refresh [code ...]')
+        return 1
+    from db_utils import get_stock_list
+
+    codes = argv[1:] or [s['code'] for s in get_stock_list()]
+    started = time.perf_counter()
+    results = refresh_many(codes)
+    new_bars = sum(r['new_bars'] for r in results.values())
+    print(f'刷新 {len(results)} 只股票，新增K线 {new_bars} 根，用时 {time.perf_counter() - started:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+import re
+import math
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from technical_indicators import calculate_kdj, calculate_rsi
+
+# 指标注册表：每个指标声明输出列名的格式（可带自定义周期）、默认参数、预热长度和缺失值填充。
+# compute_indicators 只计算请求到的列；同一组参数的多个输出（如 MACD 三条线）只算一次，
+# 均线、标准差、EMA 等中间结果在一次计算内按 (类型, 来源, 参数) 共享（例如 MA20 与布林带中轨）。
+# 新指标用 @register 注册即可，路由和图表代码不需要改动。
+
+# EMA 类指标：初值权重衰减到该比例以下所需的K线数作为预热长度
+EWM_WARMUP_TOLERANCE = 1e-4
+# 自定义周期参数的上限：再长的周期没有实际意义，且预热长度会让读取窗口的日期计算溢出
+MAX_PERIOD = 250
+
+
+class IndicatorSpec(NamedTuple):
+    name: str
+    pattern: 're.Pattern'             # 匹配输出列名，命名分组为参数（part 分组表示同组的哪一条线）
+    defaults: Dict[str, Any]          # 参数默认值
+    column: Callable[..., str]        # 参数 -> 规范的输出列名
+    warmup: Callable[..., int]        # 参数 -> 预热K线数
+    fill: float                       # 图表输出时缺失值的填充
+    func: Callable[..., Dict[str, pd.Series]]  # (ctx, **参数) -> {part: 序列}
+
+
+REGISTRY: Dict[str, IndicatorSpec] = {}
+
+
+def register(name: str, pattern: str, column: Callable[..., str], warmup: Callable[..., int],
+             defaults: Optional[Dict[str, Any]] = None, fill: float = 0):
+    """注册指标的装饰器；被装饰函数返回 {part: 序列}，只有一条线的指标 part 用 ''"""
+    def decorator(func):
+        REGISTRY[name] = IndicatorSpec(name, re.compile(pattern, re.IGNORECASE), defaults or {},
+                                       column, warmup, fill, func)
+        return func
+    return decorator
+
+
+def ewm_warmup(span: Optional[float] = None, alpha: Optional[float] = None) -> int:
+    """EMA 初值的权重衰减到 EWM_WARMUP_TOLERANCE 以下所需的K线数"""
+    if alpha is None:
+        alpha = 2 / (span + 1)
+    return int(math.ceil(math.log(EWM_WARMUP_TOLERANCE) / math.log(1 - alpha)))
+
+
+class Context:
+    """一次计算的上下文：输入K线与共享的中间结果"""
+
+    def __init__(self, data: pd.DataFrame):
+        self.data = data
+        self._memo: Dict[Tuple, pd.Series] = {}
+
+    def memo(self, key: Tuple, compute: Callable[[], pd.Series]) -> pd.Series:
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def column(self, name: str) -> pd.Series:
+        return self.memo(('column', name), lambda: pd.to_numeric(self.data[name]))
+
+    def sma(self, source: str, period: int) -> pd.Series:
+        return self.memo(('sma', source, period), lambda: self.column(source).rolling(window=period).mean())
+
+    def rolling_std(self, source: str, period: int) -> pd.Series:
+        return self.memo(('std', source, period), lambda: self.column(source).rolling(window=period).std())
+
+    def ema(self, source: str, span: int) -> pd.Series:
+        return self.memo(('ema', source, span), lambda: self.column(source).ewm(span=span).mean())
+
+    def indicator(self, name: str) -> pd.Series:
+        """
+        按列名（如 'MA20'、'KDJ_K'）取指标序列，同一组参数的指标在上下文内只算一次。
+        :raises ValueError: 不认识的指标名
+        """
+        r = resolve(name)
+        if r is None:
+            raise ValueError(f'不支持的指标: {name}')
+        group = self.memo(('indicator', r.spec.name, r.params), lambda: r.spec.func(self, **dict(r.params)))
+        return group[r.part]
+
+
+@register('vol', r'^vol$', column=lambda: 'vol', warmup=lambda: 0)
+def _volume(ctx):
+    if 'vol' in ctx.data.columns:
+        return {'': ctx.data['vol']}
+    # 与 process_stock_data_with_indicators 相同：没有成交量时生成可重现的模拟数据
+    np.random.seed(42)
+    return {'': pd.Series(np.random.randint(1000000, 10000000, len(ctx.data)), index=ctx.data.index)}
+
+
+@register('ma', r'^MA(?P<period>\d+)$', column=lambda period: f'MA{period}', warmup=lambda period: period)
+def _moving_average(ctx, period):
+    return {'': ctx.sma('close', period)}
+
+
+@register('rsi', r'^RSI(?P<period>\d+)?$', defaults={'period': 14}, fill=50,
+          column=lambda period: 'RSI' if period == 14 else f'RSI{period}',
+          warmup=lambda period: period + 1)
+def _rsi(ctx, period):
+    return {'': calculate_rsi(ctx.column('close'), period)}
+
+
+@register('macd', r'^MACD(?:_(?P<part>Signal|Histogram))?$',
+          defaults={'fast_period': 12, 'slow_period': 26, 'signal_period': 9},
+          column=lambda part='', **_: f'MACD_{part}' if part else 'MACD',
+          warmup=lambda fast_period, slow_period, signal_period: ewm_warmup(slow_period) + ewm_warmup(signal_period))
+def _macd(ctx, fast_period, slow_period, signal_period):
+    # 与 calculate_macd 相同的计算，快慢 EMA 作为共享中间结果
+    macd_line = ctx.ema('close', fast_period) - ctx.ema('close', slow_period)
+    signal_line = macd_line.ewm(span=signal_period).mean()
+    return {'': macd_line, 'Signal': signal_line, 'Histogram': macd_line - signal_line}
+
+
+@register('bb', r'^BB_(?P<part>Upper|Middle|Lower)(?P<period>\d+)?$', defaults={'period': 20, 'std_dev': 2},
+          column=lambda part, period, **_: f'BB_{part}' if period == 20 else f'BB_{part}{period}',
+          warmup=lambda period, **_: period)
+def _bollinger_bands(ctx, period, std_dev):
+    # 与 calculate_bollinger_bands 相同的计算，中轨与同周期均线共享
+    sma = ctx.sma('close', period)
+    std = ctx.rolling_std('close', period)
+    return {'Upper': sma + (std * std_dev), 'Middle': sma, 'Lower': sma - (std * std_dev)}
+
+
+@register('kdj', r'^KDJ_(?P<part>[KDJ])$', defaults={'period': 9, 'k_period': 3, 'd_period': 3}, fill=50,
+          column=lambda part, **_: f'KDJ_{part}',
+          warmup=lambda period, k_period, d_period: period + ewm_warmup(alpha=1 / k_period) + ewm_warmup(alpha=1 / d_period))
+def _kdj(ctx, period, k_period, d_period):
+    return calculate_kdj(ctx.column('high'), ctx.column('low'), ctx.column('close'), period, k_period, d_period)
+
+
+class ResolvedColumn(NamedTuple):
+    spec: IndicatorSpec
+    params: Tuple[Tuple[str, Any], ...]   # 排好序的参数，作为分组键
+    part: str
+    column: str
+
+
+def resolve(name: str) -> Optional[ResolvedColumn]:
+    """
+    把列名（不区分大小写，如 'ma7'、'RSI6'、'bb_upper'）解析为注册的指标与参数；
+    不认识或周期参数不在 1..MAX_PERIOD 内时返回 None
+    """
+    for spec in REGISTRY.values():
+        m = spec.pattern.match(name)
+        if not m:
+            continue
+        params = dict(spec.defaults)
+        part = ''
+        for key, value in m.groupdict().items():
+            if value is None:
+                continue
+            if key == 'part':
+                part = value.capitalize() if len(value) > 1 else value.upper()
+            else:
+                params[key] = int(value)
+        if any(isinstance(v, int) and not 1 <= v <= MAX_PERIOD for v in params.values()):
+            return None
+        column = spec.column(part=part, **params) if 'part' in spec.pattern.groupindex else spec.column(**params)
+        return ResolvedColumn(spec, tuple(sorted(params.items())), part, column)
+    return None
+
+
+def warmup_bars(names: Iterable[str]) -> int:
+    """计算这些列所需的最长预热K线数"""
+    bars = 0
+    for name in names:
+        resolved = resolve(name)
+        if resolved is not None:
+            bars = max(bars, resolved.spec.warmup(**dict(resolved.params)))
+    return bars
+
+
+def compute_indicators(data: pd.DataFrame, names: Iterable[str]) -> pd.DataFrame:
+    """
+    在 data（含 trade_date/open/high/low/close[/vol]）上只计算 names 列出的指标列，返回新 DataFrame。
+    :raises ValueError: 有不认识的指标名
+    """
+    resolved: List[ResolvedColumn] = []
+    for name in names:
+        r = resolve(name)
+        if r is None:
+            raise ValueError(f'不支持的指标: {name}')
+        resolved.append(r)
+
+    result = data.copy()
+    ctx = Context(result)
+    for r in resolved:
+        result[r.column] = ctx.indicator(r.column)
+    return result
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import column_cache
+from db_utils import get_data_version, read_stock_data
+from resample import resample_all
+from technical_indicators import process_stock_data_with_indicators
+
+# 预计算指标表：离线任务为每只股票、每个周期算好K线与全部指标，按列存成 .npy（与列式缓存同样的格式），
+# 放在数据库旁边的 stock-data/indicator-cache/<周期>/<代码>/ 下。
+# 每个目录记录生成时的日K数据版本，版本未变的股票会被跳过，因此任务中断后重新运行即可从断点继续。
+
+INDICATOR_DIR = os.path.join('stock-data', 'indicator-cache')
+PRECOMPUTED_PERIODS = ('day', 'week', 'month', 'year')
+ENABLED = os.environ.get('STOCK_INDICATOR_STORE', '1') != '0'
+
+
+def _period_dir(period: str) -> str:
+    return os.path.join(INDICATOR_DIR, period)
+
+
+def compute_indicator_frames(code: str, periods: Sequence[str] = PRECOMPUTED_PERIODS) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    读取全部日K，合成各周期并计算指标（与 /api/kline 实时计算的方式相同）。
+    :return: 周期 -> 含K线与指标列的 DataFrame；数据库中没有该股票时返回 None
+    """
+    daily = read_stock_data(code)
+    if daily is None or daily.empty:
+        return None
+    bars = resample_all(daily, [p for p in periods if p != 'day'])
+    frames = {}
+    for period in periods:
+        data = daily if period == 'day' else bars[period]
+        if period != 'day' and 'vol' not in data.columns:
+            data['vol'] = 0
+        frames[period] = process_stock_data_with_indicators(data)
+    return frames
+
+
+def update_code(code: str, force: bool = False) -> str:
+    """
+    更新一只股票的预计算指标。
+    :return: 'updated' 已重新计算；'skipped' 数据未变化；'missing' 数据库中没有该股票
+    """
+    version = get_data_version(code)
+    if not version['rows']:
+        return 'missing'
+    if not force and all(column_cache.stored_version(code, _period_dir(p)) == version
+                         for p in PRECOMPUTED_PERIODS):
+        return 'skipped'
+    frames = compute_indicator_frames(code)
+    if frames is None:
+        return 'missing'
+    for period, frame in frames.items():
+        arrays = {'trade_date': frame['trade_date'].to_numpy(dtype='datetime64[s]')}
+        for column in frame.columns:
+            if column != 'trade_date':
+                arrays[column] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+        column_cache.store(code, version, arrays, _period_dir(period))
+    return 'updated'
+
+
+def load_indicator_frame(code: str, period: str, start=None, end=None, last_n: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """
+    读取预计算的K线与指标（内存映射，不拷贝），并按 [start, end] 与 last_n 切片。
+    没有预计算结果或结果与当前数据版本不一致时返回 None，由调用方实时计算。
+    """
+    if not ENABLED or period not in PRECOMPUTED_PERIODS:
+        return None
+    arrays = column_cache.load(code, get_data_version(code), _period_dir(period))
+    if arrays is None:
+        return None
+    dates = arrays['trade_date']
+    lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start).normalize(), 's')))
+    hi = len(dates)
+    if end is not None:
+        next_day = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        hi = int(np.searchsorted(dates, np.datetime64(next_day, 's')))
+    if last_n is not None:
+        lo = max(lo, hi - last_n)
+    return pd.DataFrame({k: v[lo:hi] for k, v in arrays.items()}, copy=False)
+
+
+def _update_quietly(code: str, force: bool) -> str:
+    try:
+        return update_code(code, force)
+    except Exception as e:  # 单只股票出错不影响整批任务
+        print(f'{code} 计算失败: {e}', file=sys.stderr)
+        return 'failed'
+
+
+def build(codes: Optional[List[str]] = None, workers: Optional[int] = None, force: bool = False) -> Dict[str, int]:
+    """
+    为全部（或指定）股票更新预计算指标，多进程并行。
+    :return: 各状态的股票数，如 {'updated': 10, 'skipped': 4990}
+    """
+    if codes is None:
+        from db_utils import get_stock_list
+        codes = [s['code'] for s in get_stock_list()]
+    counts: Dict[str, int] = {}
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    def record(status: str, done: int) -> None:
+        counts[status] = counts.get(status, 0) + 1
+        if done % 500 == 0 or done == len(codes):
+            print(f'[{done}/{len(codes)}] {counts} {time.perf_counter() - started:.1f}s')
+
+    if workers <= 1:
+        for i, code in enumerate(codes, 1):
+            record(_update_quietly(code, force), i)
+        return counts
+    # 用 spawn 启动子进程，避免 fork 继承父进程已打开的 SQLite 连接
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = pool.map(_update_quietly, codes, [force] * len(codes), chunksize=16)
+        for i, status in enumerate(results, 1):
+            record(status, i)
+    return counts
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='预计算各周期K线指标')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_parser = sub.add_parser('build', help='更新数据有变化的股票（默认全部股票）')
+    build_parser.add_argument('codes', nargs='*', help='只处理这些股票代码')
+    build_parser.add_argument('--workers', type=int, default=None, help='进程数，默认 CPU 核数')
+    build_parser.add_argument('--force', action='store_true', help='忽略数据版本，全部重新计算')
+    sub.add_parser('clear', help='删除全部预计算结果')
+    args = parser.parse_args(argv)
+
+    if args.command == 'clear':
+        column_cache.invalidate(cache_dir=INDICATOR_DIR)
+        return 0
+    build(args.codes or None, workers=args.workers, force=args.force)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import db_utils
+from file_catalog import parse_filename
+from db_utils import (CLOSE_CANDIDATES, CODE_CANDIDATES, DATE_CANDIDATES, HIGH_CANDIDATES, LOW_CANDIDATES,
+                      NAME_CANDIDATES, OPEN_CANDIDATES, VOL_CANDIDATES)
+
+# 批量导入：把 stock-data/<代码>_<名称>.xlsx（也支持 .xls/.csv）导入 db_utils 使用的价格表。
+# - 文件在进程池中解析，列名按 db_utils 的候选列表识别，日期统一解析后按价格表的存储格式写入
+# - 主进程单连接写入（WAL），每批若干个文件一个事务，用 executemany 批量插入
+# - 同一 (代码, 日期) 只保留一行：写入前删除该股票在文件日期范围内的旧数据，文件内重复日期保留最后一行
+# - 导入记录（文件 mtime/大小）与数据写在同一事务里，再次运行只处理新增或修改过的文件
+# - 每写入一只股票就递增它的写入计数（db_utils.bump_data_revision），数据版本随之变化，
+#   列式缓存、预计算指标、响应缓存与 ETag 不会继续返回旧数据
+
+STOCK_DIR = 'stock-data'
+MANIFEST_TABLE = 'ingest_manifest'
+DEFAULT_TABLE = 'stock_daily'
+DEFAULT_DATE_FORMAT = ('text', '%Y%m%d')
+FILES_PER_TRANSACTION = 100
+
+_FIELD_CANDIDATES = {
+    'code': CODE_CANDIDATES, 'date': DATE_CANDIDATES, 'open': OPEN_CANDIDATES, 'high': HIGH_CANDIDATES,
+    'low': LOW_CANDIDATES, 'close': CLOSE_CANDIDATES, 'vol': VOL_CANDIDATES, 'name': NAME_CANDIDATES,
+}
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'vol')
+
+
+def discover_files(directory: str = STOCK_DIR) -> List[str]:
+    """目录下所有 <代码>_<名称>.xlsx/.xls/.csv 文件（Excel 临时文件除外）"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if parse_filename(f))
+
+
+def format_dates(dates: np.ndarray, date_format: Tuple[str, str]) -> np.ndarray:
+    """把 datetime64 日期转换为价格表的存储格式（yyyymmdd 整数或指定格式的文本）"""
+    kind, fmt = date_format
+    text = np.datetime_as_string(np.asarray(dates, dtype='datetime64[D]'), unit='D')   # YYYY-MM-DD
+    if kind == 'int':
+        return np.char.replace(text, '-', '').astype(np.int64)
+    if fmt == '%Y-%m-%d':
+        return text.astype(object)
+    if fmt in ('%Y%m%d', '%Y/%m/%d'):
+        return np.char.replace(text, '-', '/' if fmt == '%Y/%m/%d' else '').astype(object)
+    return pd.DatetimeIndex(dates).strftime(fmt).to_numpy(dtype=object)
+
+
+def parse_file(path: str, date_format: Tuple[str, str] = DEFAULT_DATE_FORMAT) -> Tuple[str, str, pd.DataFrame]:
+    """
+    解析一个股票文件（在子进程中执行）。
+    :param date_format: 价格表的日期存储格式，日期在子进程中转换好，主进程只负责写入
+    :return: (代码, 名称, DataFrame[date(存储格式), open, high, low, close, vol])，按日期排序且日期唯一
+    :raises ValueError: 缺少日期或 OHLC 列
+    """
+    file_code, file_name = parse_filename(path)
+    if path.lower().endswith('.csv'):
+        raw = pd.read_csv(path, dtype=str)
+    else:
+        raw = pd.read_excel(path, dtype=str)
+    lower = {str(c).strip().lower(): c for c in raw.columns}
+    found = {field: next((lower[c] for c in cands if c in lower), None) for field, cands in _FIELD_CANDIDATES.items()}
+    missing = [f for f in ('date', 'open', 'high', 'low', 'close') if found[f] is None]
+    if missing:
+        raise ValueError(f'缺少列: {", ".join(missing)}')
+
+    frame = pd.DataFrame({'date': db_utils.normalize_trade_dates(raw[found['date']]).to_numpy()})
+    for field in PRICE_FIELDS:
+        frame[field] = pd.to_numeric(raw[found[field]], errors='coerce').to_numpy() if found[field] else np.nan
+    frame = frame.dropna(subset=['date']).sort_values('date', kind='stable')
+    frame = frame.drop_duplicates('date', keep='last').reset_index(drop=True)
+    frame['date'] = format_dates(frame['date'].to_numpy(), date_format)
+
+    def first_value(field, default):
+        if found[field] is None:
+            return default
+        values = raw[found[field]].dropna()
+        return str(values.iloc[0]).strip() if len(values) else default
+
+    return first_value('code', file_code), first_value('name', file_name), frame
+
+
+def _parse_quietly(path: str, date_format: Tuple[str, str]) -> Tuple[str, Optional[Tuple[str, str, pd.DataFrame]], Optional[str]]:
+    try:
+        return path, parse_file(path, date_format), None
+    except Exception as e:  # 单个文件出错不影响整批导入
+        return path, None, str(e)
+
+
+class _Target:
+    """写入目标：价格表、列映射与日期存储格式"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        try:
+            self.table, self.colmap = db_utils.get_table_and_columns(conn)
+        except RuntimeError:
+            # 还没有价格表时按 db_utils 能识别的结构新建
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS "{DEFAULT_TABLE}" (
+                    ts_code TEXT, name TEXT, trade_date TEXT,
+                    open REAL, high REAL, low REAL, close REAL, vol REAL
+                )''')
+            conn.commit()
+            db_utils.invalidate_schema_cache()
+            self.table, self.colmap = db_utils.get_table_and_columns(conn)
+        self.date_format = db_utils.get_date_format(conn) or DEFAULT_DATE_FORMAT
+        self.fields = ['code', 'date'] + [f for f in ('open', 'high', 'low', 'close', 'vol', 'name') if self.colmap[f]]
+        columns = ', '.join(f'"{self.colmap[f]}"' for f in self.fields)
+        self.insert_sql = f'INSERT INTO "{self.table}" ({columns}) VALUES ({", ".join("?" * len(self.fields))})'
+        self.delete_sql = (f'DELETE FROM "{self.table}" WHERE "{self.colmap["code"]}" = ? '
+                           f'AND "{self.colmap["date"]}" BETWEEN ? AND ?')
+
+    def write(self, conn: sqlite3.Connection, code: str, name: str, frame: pd.DataFrame) -> int:
+        if frame.empty:
+            return 0
+        dates = frame['date'].tolist()
+        conn.execute(self.delete_sql, (code, dates[0], dates[-1]))
+        columns = {'code': [code] * len(frame), 'date': dates, 'name': [name] * len(frame)}
+        for field in PRICE_FIELDS:
+            # NaN 写成 NULL
+            values = frame[field].to_numpy(dtype=np.float64)
+            columns[field] = np.where(np.isnan(values), None, values).tolist()
+        conn.executemany(self.insert_sql, zip(*[columns[f] for f in self.fields]))
+        # 修正过的文件重新导入时行数和最大日期可能不变，靠写入计数让缓存与 ETag 失效
+        db_utils.bump_data_revision(conn, code)
+        return len(frame)
+
+
+def _open_write_conn() -> sqlite3.Connection:
+    directory = os.path.dirname(db_utils.DB_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_utils.DB_PATH)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-262144')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{MANIFEST_TABLE}" (
+            path TEXT PRIMARY KEY,
+            code TEXT,
+            mtime_ns INTEGER,
+            size INTEGER,
+            rows INTEGER,
+            ingested_at REAL
+        )''')
+    conn.commit()
+    return conn
+
+
+def _pending_files(conn: sqlite3.Connection, files: Sequence[str], full: bool) -> List[Tuple[str, int, int]]:
+    # 与导入记录比较 mtime 和大小，返回需要导入的 (路径, mtime_ns, 大小)
+    done = {} if full else {row[0]: (row[1], row[2]) for row in
+                            conn.execute(f'SELECT path, mtime_ns, size FROM "{MANIFEST_TABLE}"')}
+    pending = []
+    for path in files:
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        if done.get(key) != (st.st_mtime_ns, st.st_size):
+            pending.append((path, st.st_mtime_ns, st.st_size))
+    return pending
+
+
+def ingest(directory: str = STOCK_DIR, workers: Optional[int] = None, full: bool = False,
+           files_per_transaction: int = FILES_PER_TRANSACTION) -> Dict[str, int]:
+    """
+    导入目录下新增或修改过的股票文件。
+    :param full: 忽略导入记录，重新导入全部文件
+    :return: {'files', 'skipped', 'ingested', 'failed', 'rows'}
+    """
+    started = time.perf_counter()
+    files = discover_files(directory)
+    conn = _open_write_conn()
+    try:
+        target = _Target(conn)
+        # 先保证 (code, date) 索引存在，写入前按代码和日期范围删除旧数据时走索引
+        db_utils.ensure_indexes()
+        pending = _pending_files(conn, files, full)
+        stats = {'files': len(files), 'skipped': len(files) - len(pending), 'ingested': 0, 'failed': 0, 'rows': 0}
+        meta = {path: (mtime_ns, size) for path, mtime_ns, size in pending}
+        in_transaction = 0
+
+        def handle(path, parsed, error):
+            nonlocal in_transaction
+            if parsed is None:
+                stats['failed'] += 1
+                print(f'{path} 解析失败: {error}', file=sys.stderr)
+                return
+            code, name, frame = parsed
+            stats['rows'] += target.write(conn, code, name, frame)
+            conn.execute(f'INSERT OR REPLACE INTO "{MANIFEST_TABLE}" VALUES (?, ?, ?, ?, ?, ?)',
+                         (os.path.abspath(path), code, *meta[path], len(frame), time.time()))
+            stats['ingested'] += 1
+            in_transaction += 1
+            if in_transaction >= files_per_transaction:
+                conn.commit()
+                in_transaction = 0
+            done = stats['ingested'] + stats['failed']
+            if done % 500 == 0 or done == len(pending):
+                print(f'[{done}/{len(pending)}] {stats["rows"]} 行 {time.perf_counter() - started:.1f}s')
+
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(pending) <= 1:
+            for path, _, _ in pending:
+                handle(*_parse_quietly(path, target.date_format))
+        else:
+            # 用 spawn 启动子进程，避免 fork 继承父进程已打开的 SQLite 连接
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(_parse_quietly, path, target.date_format) for path, _, _ in pending]
+                for future in as_completed(futures):
+                    handle(*future.result())
+        conn.commit()
+    finally:
+        conn.close()
+    return stats
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='把股票 Excel/CSV 文件批量导入价格数据库')
+    parser.add_argument('directory', nargs='?', default=STOCK_DIR, help='股票文件目录，默认 stock-data')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认 CPU 核数')
+    parser.add_argument('--full', action='store_true', help='忽略导入记录，重新导入全部文件')
+    parser.add_argument('--batch', type=int, default=FILES_PER_TRANSACTION, help='每个事务包含的文件数')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    stats = ingest(args.directory, workers=args.workers, full=args.full, files_per_transaction=args.batch)
+    print(f'{stats}，用时 {time.perf_counter() - started:.1f}s')
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
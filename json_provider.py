@@ -0,0 +1,73 @@
+import sys
+import json
+import math
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    orjson = None
+
+# JSON 序列化与 Flask JSON 提供者。应用启动时就会导入，因此这里不导入 numpy：
+# numpy 对象只可能在 numpy 已被其它模块加载后出现，序列化时再从 sys.modules 取。
+
+
+def _default(obj):
+    np = sys.modules.get('numpy')
+    if np is not None:
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, np.generic):
+            return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _finite(obj):
+    # 把 NaN/inf 换成 None（与 orjson 一致输出 null），标准库 json 否则会写出不合法的 NaN 记号
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(obj, (np.ndarray, np.generic)):
+        return _finite(_default(obj))
+    return obj
+
+
+def dumps(obj, sort_keys=False):
+    """
+    序列化为 JSON 字符串；有 orjson 时使用 orjson（原生支持 numpy 数组，NaN 输出为 null），
+    否则用标准库 json，同样把 NaN/inf 输出为 null
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+    try:
+        # 绝大多数数据没有 NaN，先直接序列化，遇到 NaN/inf 再清洗后重试
+        return json.dumps(obj, default=_default, sort_keys=sort_keys, ensure_ascii=False, allow_nan=False)
+    except ValueError:
+        return json.dumps(_finite(obj), default=_default, sort_keys=sort_keys, ensure_ascii=False, allow_nan=False)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON 提供者：jsonify 与模板中的 |tojson 都走 dumps()
+    """
+
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop('sort_keys', False)
+        if kwargs:
+            # 带有其它定制参数时交给默认实现
+            kwargs['sort_keys'] = sort_keys
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, sort_keys=sort_keys)
+
+    def response(self, *args, **kwargs):
+        # 默认实现会带上 separators/indent 参数，这里直接输出紧凑 JSON
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(f'{dumps(obj)}\n', mimetype=self.mimetype)
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 图表数据结果缓存：键为 (code, 周期, 指标, 窗口参数...)，值为序列化好的 JSON 字节串。
+# 第一级是进程内按字节数限额的 LRU（带 TTL），第二级是可选的磁盘目录，供多个 worker 进程共享。
+# 每条缓存都记录生成时的源数据版本（行数、最大日期），版本变化即视为未命中。
+
+ENABLED = os.environ.get('STOCK_PAYLOAD_CACHE', '1') != '0'
+MAX_BYTES = int(float(os.environ.get('STOCK_PAYLOAD_CACHE_MB', '64')) * 1024 * 1024)
+TTL_SECONDS = float(os.environ.get('STOCK_PAYLOAD_CACHE_TTL', str(6 * 3600)))
+# 设置后启用磁盘缓存，例如 stock-data/payload-cache
+DISK_DIR = os.environ.get('STOCK_PAYLOAD_CACHE_DIR') or None
+
+# 同一个键同时只计算一次，按键哈希分段加锁
+_LOCK_STRIPES = 64
+
+
+class _Entry:
+    __slots__ = ('version', 'body', 'expires')
+
+    def __init__(self, version: Dict[str, Any], body: bytes, expires: float):
+        self.version = version
+        self.body = body
+        self.expires = expires
+
+
+class BytesLRU:
+    """按字节数限额的 LRU，线程安全"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Tuple, _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key: Tuple, version: Dict[str, Any]) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires < time.monotonic():
+                self._pop(key)
+                self.stats['expired'] += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry.body
+
+    def put(self, key: Tuple, version: Dict[str, Any], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = _Entry(version, body, time.monotonic() + self.ttl)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def discard(self, code: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if code is None or k[0] == code]:
+                self._pop(key)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+    def _pop(self, key: Tuple) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+
+_memory = BytesLRU(MAX_BYTES, TTL_SECONDS)
+_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+
+def _disk_path(key: Tuple) -> str:
+    safe = re.sub(r'[^0-9A-Za-z._-]', '_', str(key[0]))
+    digest = hashlib.sha1(repr(key[1:]).encode('utf-8')).hexdigest()
+    return os.path.join(DISK_DIR, safe, f'{digest}.json')
+
+
+def _disk_load(key: Tuple, version: Dict[str, Any]) -> Optional[bytes]:
+    # 文件格式：第一行是元数据（版本），其后是 JSON 正文
+    path = _disk_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > TTL_SECONDS:
+            return None
+        with open(path, 'rb') as f:
+            meta = json.loads(f.readline())
+            if meta.get('version') != version:
+                return None
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+
+def _disk_store(key: Tuple, version: Dict[str, Any], body: bytes) -> None:
+    path = _disk_path(key)
+    tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps({'version': version}, ensure_ascii=False).encode('utf-8'))
+            f.write(b'\n')
+            f.write(body)
+        os.replace(tmp_path, path)
+    except OSError:
+        # 磁盘缓存只是加速手段，写失败不影响结果
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load(key: Tuple, version: Dict[str, Any]) -> Optional[bytes]:
+    """
+    读取缓存：先查内存，再查磁盘（命中后放回内存）。
+    :param key: 第一个元素必须是股票代码（按代码失效时使用）
+    :param version: 当前源数据版本，与缓存记录不一致时返回 None
+    """
+    if not ENABLED:
+        return None
+    body = _memory.get(key, version)
+    if body is None and DISK_DIR:
+        body = _disk_load(key, version)
+        if body is not None:
+            _memory.stats['disk_hits'] += 1
+            _memory.put(key, version, body)
+    return body
+
+
+def store(key: Tuple, version: Dict[str, Any], body: bytes) -> None:
+    """写入内存缓存，启用磁盘缓存时同时写入磁盘"""
+    if not ENABLED:
+        return
+    _memory.put(key, version, body)
+    if DISK_DIR:
+        _disk_store(key, version, body)
+
+
+def get_or_compute(key: Tuple, version: Dict[str, Any],
+                   compute: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+    """
+    取缓存，未命中时调用 compute() 生成并写入缓存。
+    同一个键并发未命中时只有一个线程计算，其余线程等待后直接读取结果。
+    compute() 返回 None 表示没有数据，不缓存。
+    """
+    body = load(key, version)
+    if body is not None:
+        _memory.stats['hits'] += 1
+        return body
+    with _locks[hash(key) % _LOCK_STRIPES]:
+        body = load(key, version)
+        if body is not None:
+            _memory.stats['hits'] += 1
+            return body
+        _memory.stats['misses'] += 1
+        body = compute()
+        if body is not None:
+            store(key, version, body)
+    return body
+
+
+def invalidate(code: Optional[str] = None) -> None:
+    """删除某只股票（或全部）的缓存"""
+    _memory.discard(code)
+    if DISK_DIR:
+        target = os.path.dirname(_disk_path((code,))) if code else DISK_DIR
+        shutil.rmtree(target, ignore_errors=True)
+
+
+def get_stats() -> Dict[str, Any]:
+    """内存缓存的命中、淘汰次数与占用字节数"""
+    return dict(_memory.info(), disk_dir=DISK_DIR, enabled=ENABLED)
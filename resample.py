@@ -0,0 +1,131 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+# 日K -> 周/月/季/年K 的向量化合成：在按日期排序的数组上找分组边界，再用 ufunc.reduceat 聚合
+
+PERIODS = ('week', 'month', 'quarter', 'year')
+# 月K可以继续合成季K和年K（周K跨月，不能再向上合成）
+_PARENT = {'quarter': 'month', 'year': 'month'}
+_N_DAY = re.compile(r'^([1-9]\d*)d$')
+_BUSDAY_EPOCH = np.datetime64('1970-01-01', 'D')
+# N 日K 的 N 上限（约一年的交易日）；更大的 N 没有意义，且会让指标预热窗口的日期计算溢出
+MAX_N_DAYS = 250
+
+OHLCV_FIELDS = ['open', 'high', 'low', 'close', 'vol']
+
+
+def is_valid_period(period: str) -> bool:
+    """是否为支持的K线周期（含日K本身）"""
+    if period == 'day' or period in PERIODS:
+        return True
+    m = _N_DAY.match(period)
+    return bool(m) and int(m.group(1)) <= MAX_N_DAYS
+
+
+def period_start(date, period: str) -> pd.Timestamp:
+    """
+    date 所在的那根 period 周期K线的第一天（自然日），分组规则与 _period_keys 一致；日K即 date 本身。
+    按日期窗口合成周期K线时从这一天开始读取，第一根K线才是完整的。
+    """
+    day = pd.Timestamp(date).normalize()
+    if period == 'week':
+        return day - pd.Timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    m = _N_DAY.match(period)
+    if m:
+        n = int(m.group(1))
+        index = int(np.busday_count(_BUSDAY_EPOCH, np.datetime64(day.date(), 'D')))
+        return pd.Timestamp(np.busday_offset(_BUSDAY_EPOCH, index // n * n, roll='forward'))
+    return day
+
+
+def _bar_starts(keys: np.ndarray) -> np.ndarray:
+    # 分组键变化的位置即新K线的起点
+    if len(keys) == 0:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+
+
+def _period_keys(dates: np.ndarray, period: str) -> np.ndarray:
+    days = dates.astype('datetime64[D]')
+    if period == 'week':
+        # 1970-01-01 是周四，+3 后按周一对齐，与 ISO 周（周一至周日）的划分一致
+        return (days.astype(np.int64) + 3) // 7
+    months = days.astype('datetime64[M]').astype(np.int64)
+    if period == 'month':
+        return months
+    if period == 'quarter':
+        return months // 3
+    if period == 'year':
+        return months // 12
+    m = _N_DAY.match(period)
+    if m:
+        # N 日K：按自 1970-01-01 起的工作日（周一至周五）序号每 N 个分一组。分组边界只由日期决定，
+        # 与读取窗口的起点无关，改变 start/last_n 或指标预热长度时K线不会错位；节假日所在的组不足 N 根日K
+        return np.busday_count(_BUSDAY_EPOCH, days) // int(m.group(1))
+    raise ValueError(f'不支持的K线周期: {period}')
+
+
+def reduce_bars(arrays: Dict[str, np.ndarray], starts: np.ndarray) -> Dict[str, np.ndarray]:
+    if len(starts) == 0:
+        return {k: v[:0] for k, v in arrays.items()}
+    ends = np.append(starts[1:], len(arrays['trade_date'])) - 1
+    bars = {
+        'trade_date': arrays['trade_date'][ends],
+        'open': arrays['open'][starts],
+        'high': np.fmax.reduceat(arrays['high'], starts),
+        'low': np.fmin.reduceat(arrays['low'], starts),
+        'close': arrays['close'][ends],
+    }
+    if 'vol' in arrays:
+        bars['vol'] = np.add.reduceat(arrays['vol'], starts)
+    return bars
+
+
+def _to_arrays(stock_data: pd.DataFrame) -> Dict[str, np.ndarray]:
+    dates = pd.to_datetime(stock_data['trade_date']).to_numpy(dtype='datetime64[s]')
+    valid = ~np.isnat(dates)
+    arrays = {'trade_date': dates[valid]}
+    for field in OHLCV_FIELDS:
+        if field in stock_data.columns:
+            values = pd.to_numeric(stock_data[field], errors='coerce').to_numpy(dtype=np.float64)[valid]
+            # 成交量按 pandas sum 的语义把缺失当 0
+            arrays[field] = np.nan_to_num(values) if field == 'vol' else values
+    if len(arrays['trade_date']) > 1 and (arrays['trade_date'][1:] < arrays['trade_date'][:-1]).any():
+        order = np.argsort(arrays['trade_date'], kind='stable')
+        arrays = {k: v[order] for k, v in arrays.items()}
+    return arrays
+
+
+def resample_all(stock_data: pd.DataFrame,
+                 periods: Iterable[str] = ('week', 'month', 'year')) -> Dict[str, pd.DataFrame]:
+    """
+    一次性把日K合成为多个周期的K线。
+    :param stock_data: 含 trade_date/open/high/low/close（可选 vol）的日K数据
+    :param periods: 'week'(ISO 周)、'month'、'quarter'、'year' 或 'Nd'（每 N 个工作日，分组边界固定，见 _period_keys）
+    :return: 周期 -> DataFrame(trade_date, open, high, low, close[, vol])，
+             trade_date 为该周期最后一个交易日
+    """
+    daily = _to_arrays(stock_data)
+    cache: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def bars_for(period: str) -> Dict[str, np.ndarray]:
+        if period not in cache:
+            parent: Optional[str] = _PARENT.get(period)
+            source = bars_for(parent) if parent else daily
+            cache[period] = reduce_bars(source, _bar_starts(_period_keys(source['trade_date'], period)))
+        return cache[period]
+
+    return {period: pd.DataFrame(bars_for(period)) for period in periods}
+
+
+def resample_ohlcv(stock_data: pd.DataFrame, period: str) -> pd.DataFrame:
+    """合成单个周期的K线，参数与返回值同 resample_all"""
+    return resample_all(stock_data, (period,))[period]
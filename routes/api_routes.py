@@ -0,0 +1,83 @@
+from flask import jsonify, request
+
+from http_cache import make_etag, not_modified, set_validators
+
+# start/end 允许的日期范围与 last_n/points 的上限，超出时 400
+EARLIEST_DATE = '1900-01-01'
+LATEST_DATE = '2200-12-31'
+MAX_COUNT = 1000000
+
+
+def _parse_date(value):
+    """解析日期参数；不合法、带时区（与库中不带时区的日期无法比较）或超出范围时返回 None"""
+    import pandas as pd
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    if pd.isna(ts) or ts.tzinfo is not None or not pd.Timestamp(EARLIEST_DATE) <= ts <= pd.Timestamp(LATEST_DATE):
+        return None
+    return ts
+
+
+def register_api_routes(app):
+    # K线与指标数据接口：/api/kline/<code>?period=day&start=&end=&last_n=&indicators=ma5,macd,ma7&points=
+    # points 为目标点数，区间内K线更多时返回降采样后的数据
+    @app.route('/api/kline/<code>')
+    def api_kline(code):
+        # 数据与指标模块（numpy/pandas）在首次请求时才导入
+        from chart_payload import indicator_column, kline_cache_key, kline_json
+        from db_utils import get_data_version, get_db_mtime
+        from resample import is_valid_period
+
+        period = request.args.get('period', 'day')
+        if not is_valid_period(period):
+            return jsonify({'error': f'不支持的K线周期: {period}'}), 400
+
+        # indicators=all 返回全部指标，留空则只返回K线
+        names = [n.strip() for n in request.args.get('indicators', '').split(',') if n.strip()]
+        indicators = True if 'all' in names else names
+        unknown = [n for n in names if n != 'all' and indicator_column(n) is None]
+        if unknown:
+            return jsonify({'error': f'不支持的指标: {", ".join(unknown)}'}), 400
+
+        # 日期窗口与数量参数在这里校验，非法时 400，不让解析错误变成 500 或误报 404
+        start = request.args.get('start') or None
+        end = request.args.get('end') or None
+        dates = {}
+        for name, value in (('start', start), ('end', end)):
+            dates[name] = None if value is None else _parse_date(value)
+            if value is not None and dates[name] is None:
+                return jsonify({'error': f'{name} 不是 {EARLIEST_DATE} 至 {LATEST_DATE} 之间的日期: {value}'}), 400
+        if start is not None and end is not None and dates['start'] > dates['end']:
+            return jsonify({'error': f'start 晚于 end: {start} > {end}'}), 400
+        counts = {}
+        for name in ('last_n', 'points'):
+            value = request.args.get(name) or None
+            if value is not None and not (value.isascii() and value.isdigit() and 0 < int(value) <= MAX_COUNT):
+                return jsonify({'error': f'{name} 必须是 1 至 {MAX_COUNT} 之间的整数: {value}'}), 400
+            counts[name] = int(value) if value is not None else None
+
+        params = dict(period=period,
+                      start=start,
+                      end=end,
+                      last_n=counts['last_n'],
+                      indicators=indicators or None,
+                      points=counts['points'])
+        version = get_data_version(code)
+        if not version['rows']:
+            return jsonify({'error': '数据库中未找到该股票数据'}), 404
+
+        # 数据版本与请求参数不变时直接 304，不再读库计算
+        etag = make_etag(kline_cache_key(code, **params), version)
+        last_modified = get_db_mtime()
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+
+        body = kline_json(code, **params)
+        if body is None:
+            return jsonify({'error': '数据库中未找到该股票数据'}), 404
+
+        # 缓存里存的就是序列化好的 JSON，直接输出
+        return set_validators(app.response_class(body, mimetype='application/json'), etag, last_modified)
@@ -0,0 +1,25 @@
+import json
+from flask import Response, jsonify, request, stream_with_context
+
+def register_screen_routes(app):
+    # 选股接口：/screen?expr=RSI<30 and cross_above(MACD, MACD_Signal)&codes=000001.SZ,600000.SH
+    # 结果以 NDJSON 流式返回（每行一只股票），扫描完一个分块就输出一批
+    @app.route('/screen')
+    def screen_stocks():
+        # 选股器依赖 numpy/pandas 与指标模块，首次请求时才导入
+        from screener import Expression, screen
+        source = request.args.get('expr', '').strip()
+        if not source:
+            return jsonify({'error': '缺少筛选表达式 expr'}), 400
+        try:
+            Expression(source)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        codes = [c.strip() for c in request.args.get('codes', '').split(',') if c.strip()] or None
+
+        def generate():
+            # 进程数由服务端决定（CPU 核数），不接受客户端指定
+            for row in screen(source, codes):
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
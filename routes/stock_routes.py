@@ -1,15 +1,11 @@
-import os
-import pandas as pd
 from flask import render_template
-from pyecharts import options as opts
-from pyecharts.charts import Kline, Line
-from pyecharts.commons.utils import JsCode
-from pyecharts.globals import ThemeType
-from db_utils import read_stock_data as db_read_stock_data, get_stock_name
 
 def register_stock_routes(app):
+    # pandas/pyecharts 等较重的依赖在首次访问该页面时才导入，不拖慢应用启动
+
     # 读取股票数据
     def read_stock_data(file_path):
+        import pandas as pd
         df = pd.read_excel(file_path)
         # 确保日期格式正确
         df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
@@ -20,13 +16,14 @@ def register_stock_routes(app):
 
     # 生成K线图
     def generate_kline_chart(stock_data, stock_name):
+        from pyecharts import options as opts
+        from pyecharts.charts import Kline, Line
+        from pyecharts.globals import ThemeType
+        from chart_payload import kline_values
+
         # 准备K线数据
         dates = stock_data['trade_date'].tolist()
-        k_data = [[float(stock_data.loc[i, 'open']), 
-                   float(stock_data.loc[i, 'close']), 
-                   float(stock_data.loc[i, 'low']), 
-                   float(stock_data.loc[i, 'high'])] 
-                  for i in stock_data.index]
+        k_data = kline_values(stock_data)
         
         # 计算移动平均线
         ma5_data = stock_data['close'].rolling(5).mean().tolist()
@@ -85,16 +82,16 @@ def register_stock_routes(app):
 
     @app.route('/stock/<code>')
     def stock_chart(code):
-        # 查找对应的股票文件
-        stock_files = [f for f in os.listdir('stock-data') if f.startswith(code)]
-        if not stock_files:
+        from file_catalog import get_catalog, load_frame
+        # 查找对应的股票文件（目录索引缓存在进程内，不再每次请求都扫描目录）
+        entry = get_catalog().get(code)
+        if entry is None:
             return "股票代码不存在"
         
-        file_path = os.path.join('stock-data', stock_files[0])
-        stock_name = stock_files[0].split('_')[1].replace('.xlsx', '')
+        stock_name = entry.name
         
-        # 读取数据并生成图表
-        stock_data = read_stock_data(file_path)
+        # 读取数据并生成图表（文件未修改时复用已解析的数据）
+        stock_data = load_frame(entry.path, read_stock_data)
         chart = generate_kline_chart(stock_data, stock_name)
         
         return render_template('stock.html', chart=chart.render_embed(), stock_name=stock_name)
\ No newline at end of file
@@ -0,0 +1,318 @@
+import ast
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from indicator_registry import compute_indicators, resolve, warmup_bars
+
+# 选股器：用一个小的表达式语言在全市场上筛选最新一根K线满足条件的股票，例如
+#   RSI < 30 and cross_above(MACD, MACD_Signal)
+#   close > ref(close, 1) * 1.05 and vol > 2 * ref(vol, 1)
+# 表达式用 ast 解析并只允许白名单中的语法；字段为 OHLCV 或指标列名（大小写不敏感，支持 ma7 这类自定义周期）。
+# 全市场扫描按代码分块交给进程池，结果按块完成的顺序流式返回。
+
+# vol 由指标注册表提供（没有成交量列时与图表一致使用模拟数据）
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+DEFAULT_CHUNK_SIZE = 50
+# 表达式的长度、嵌套层数与回看K线数上限，表达式来自 HTTP 请求，超出时按语法错误处理
+MAX_EXPRESSION_LENGTH = 2000
+MAX_DEPTH = 50
+MAX_LOOKBACK = 250
+
+
+def _ref(values, n):
+    n = int(n)
+    out = np.full(len(values), np.nan)
+    if n < len(values):
+        out[n:] = values[:len(values) - n]
+    return out
+
+
+def _cross_above(a, b):
+    return (a > b) & (_ref(a, 1) <= _ref(b, 1))
+
+
+def _cross_below(a, b):
+    return (a < b) & (_ref(a, 1) >= _ref(b, 1))
+
+
+# 函数名 -> (实现, 参数个数, 额外回看的K线数)；ref 的回看数取第二个参数
+FUNCTIONS = {
+    'ref': (_ref, 2, None),
+    'cross_above': (_cross_above, 2, 1),
+    'cross_below': (_cross_below, 2, 1),
+    'abs': (np.abs, 1, 0),
+    'max': (np.fmax, 2, 0),
+    'min': (np.fmin, 2, 0),
+}
+
+_COMPARE_OPS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+    ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_BIN_OPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+}
+
+
+class Expression:
+    """
+    解析后的筛选表达式。
+    fields: 表达式用到的列（OHLCV 原名或规范的指标列名）；lookback: 最新K线之外还需要的K线数
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ValueError(f'表达式过长（最多 {MAX_EXPRESSION_LENGTH} 个字符）')
+        self.fields: Dict[str, str] = {}   # 表达式中的名字 -> 列名
+        try:
+            self.tree = ast.parse(source, mode='eval')
+            self.lookback = self._check(self.tree.body)
+        except SyntaxError as e:
+            raise ValueError(f'表达式语法错误: {e.msg}')
+        except (RecursionError, MemoryError):
+            # 解析器本身在嵌套极深时也可能耗尽栈或内存
+            raise ValueError(f'表达式嵌套过深（最多 {MAX_DEPTH} 层）')
+        if self.lookback > MAX_LOOKBACK:
+            raise ValueError(f'表达式需要回看 {self.lookback} 根K线，最多 {MAX_LOOKBACK} 根')
+
+    def _check(self, node, depth: int = 0) -> int:
+        # 校验语法白名单，同时收集字段并返回该子表达式需要的回看K线数；
+        # 限制嵌套层数，之后递归求值时不会耗尽栈
+        if depth > MAX_DEPTH:
+            raise ValueError(f'表达式嵌套过深（最多 {MAX_DEPTH} 层）')
+        depth += 1
+        if isinstance(node, ast.BoolOp):
+            return max(self._check(v, depth) for v in node.values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            return self._check(node.operand, depth)
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE_OPS for op in node.ops):
+            return max(self._check(v, depth) for v in [node.left] + node.comparators)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            return max(self._check(node.left, depth), self._check(node.right, depth))
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return 0
+        if isinstance(node, ast.Name):
+            self.fields[node.id] = self._column(node.id)
+            return 0
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            if node.func.id not in FUNCTIONS:
+                raise ValueError(f'不支持的函数: {node.func.id}')
+            _, argc, extra = FUNCTIONS[node.func.id]
+            if len(node.args) != argc:
+                raise ValueError(f'{node.func.id} 需要 {argc} 个参数')
+            if extra is None:
+                n = node.args[1]
+                if not (isinstance(n, ast.Constant) and type(n.value) is int and 0 <= n.value <= MAX_LOOKBACK):
+                    raise ValueError(f'ref 的第二个参数必须是 0 至 {MAX_LOOKBACK} 之间的整数')
+                return self._check(node.args[0], depth) + n.value
+            return max(self._check(a, depth) for a in node.args) + extra
+        raise ValueError(f'不支持的表达式: {ast.unparse(node)}')
+
+    @staticmethod
+    def _column(name: str) -> str:
+        if name.lower() in PRICE_FIELDS:
+            return name.lower()
+        resolved = resolve(name)
+        if resolved is None:
+            raise ValueError(f'不认识的字段: {name}')
+        return resolved.column
+
+    @property
+    def indicator_columns(self) -> List[str]:
+        return sorted({c for c in self.fields.values() if c not in PRICE_FIELDS})
+
+    @property
+    def bars_needed(self) -> int:
+        """算出最新一根K线上的结果需要读取的K线数（指标预热 + 回看）"""
+        return warmup_bars(self.indicator_columns) + self.lookback + 1
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        """在已含所需列的 data 上逐K线求值，返回布尔（或数值）数组"""
+        columns = {name: pd.to_numeric(data[column]).to_numpy(dtype=np.float64)
+                   for name, column in self.fields.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._eval(self.tree.body, columns)
+
+    def _eval(self, node, columns):
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            result = self._eval(node.values[0], columns)
+            for v in node.values[1:]:
+                result = combine(result, self._eval(v, columns))
+            return result
+        if isinstance(node, ast.UnaryOp):
+            value = self._eval(node.operand, columns)
+            return np.logical_not(value) if isinstance(node.op, ast.Not) else np.negative(value)
+        if isinstance(node, ast.Compare):
+            # 链式比较 a < b < c 等价于 a < b and b < c
+            left = self._eval(node.left, columns)
+            result = None
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._eval(comparator, columns)
+                part = _COMPARE_OPS[type(op)](left, right)
+                result = part if result is None else np.logical_and(result, part)
+                left = right
+            return result
+        if isinstance(node, ast.BinOp):
+            return _BIN_OPS[type(node.op)](self._eval(node.left, columns), self._eval(node.right, columns))
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return columns[node.id]
+        func = FUNCTIONS[node.func.id][0]
+        if node.func.id == 'ref':
+            return func(self._eval(node.args[0], columns), node.args[1].value)
+        return func(*[self._eval(a, columns) for a in node.args])
+
+
+def screen_code(code: str, expression: Expression) -> Optional[Dict[str, Any]]:
+    """
+    对一只股票的最新K线求值。
+    :return: 满足条件时返回 {'code', 'trade_date', 各字段最新值}，否则 None
+    """
+    from db_utils import format_trade_dates, read_stock_data
+
+    data = read_stock_data(code, last_n=expression.bars_needed)
+    if data is None or data.empty:
+        return None
+    data = compute_indicators(data, expression.indicator_columns)
+    result = expression.evaluate(data)
+    latest = np.asarray(result)[-1] if np.ndim(result) else result
+    if not bool(latest) or (isinstance(latest, float) and np.isnan(latest)):
+        return None
+    row = {'code': code, 'trade_date': format_trade_dates(data['trade_date'].iloc[-1:])[0]}
+    for name, column in expression.fields.items():
+        value = float(pd.to_numeric(data[column]).iloc[-1])
+        row[name] = None if np.isnan(value) else value
+    return row
+
+
+def _screen_chunk(codes: Sequence[str], source: str) -> List[Dict[str, Any]]:
+    # 进程池中执行：每个子进程各自解析表达式、使用自己的数据库连接
+    expression = Expression(source)
+    matches = []
+    for code in codes:
+        try:
+            row = screen_code(code, expression)
+        except Exception as e:  # 单只股票数据异常不影响整次扫描
+            print(f'{code} 筛选失败: {e}', file=sys.stderr)
+            continue
+        if row is not None:
+            matches.append(row)
+    return matches
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # 进程池在进程内复用，避免每次扫描都重新启动子进程；用 spawn 避免继承父进程的 SQLite 连接。
+    # 池只创建一次（大小取首次扫描的进程数），并发的多次扫描共用它，不会在别的扫描提交分块时被替换或关闭
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # 子进程异常退出（内存不足、段错误等）后整个池都会变成 BrokenProcessPool，丢弃它，下次使用时重建
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def screen(source: str, codes: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+           chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    扫描全部（或指定）股票，逐条产出满足条件的结果（按分块完成的顺序）。
+    :param source: 筛选表达式；语法或字段错误时立即抛出 ValueError
+    :param workers: 进程数，默认且最多为 CPU 核数；1 表示在当前进程内执行
+    """
+    Expression(source)
+    names: Dict[str, str] = {}
+    if codes is None:
+        from db_utils import get_stock_list
+        stocks = get_stock_list()
+        codes = [s['code'] for s in stocks]
+        names = {s['code']: s['name'] for s in stocks}
+    chunks = [list(codes[i:i + chunk_size]) for i in range(0, len(codes), chunk_size)]
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, cpus)
+
+    def with_name(row):
+        if row['code'] in names:
+            row['name'] = names[row['code']]
+        return row
+
+    if workers <= 1:
+        for chunk in chunks:
+            for row in _screen_chunk(chunk, source):
+                yield with_name(row)
+        return
+    pending = dict(enumerate(chunks))
+    # 进程池损坏时换一个新池，把还没有结果的分块重试一次；再次损坏（多半是某个分块本身导致崩溃）则抛出
+    for attempt in range(2):
+        pool = _get_pool(workers)
+        futures: Dict[Any, int] = {}
+        try:
+            futures = {pool.submit(_screen_chunk, chunk, source): i for i, chunk in pending.items()}
+            for future in as_completed(futures):
+                rows = future.result()
+                del pending[futures[future]]
+                for row in rows:
+                    yield with_name(row)
+            return
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+        finally:
+            # 调用方提前停止读取（例如客户端断开）时取消尚未开始的分块
+            for future in futures:
+                future.cancel()
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='按表达式筛选最新K线满足条件的股票')
+    parser.add_argument('expression', help='例如 "RSI < 30 and cross_above(MACD, MACD_Signal)"')
+    parser.add_argument('codes', nargs='*', help='只扫描这些股票代码（默认全部）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认 CPU 核数')
+    parser.add_argument('--json', action='store_true', help='每行输出一条 JSON')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        count = 0
+        for row in screen(args.expression, args.codes or None, workers=args.workers):
+            count += 1
+            if args.json:
+                print(json.dumps(row, ensure_ascii=False))
+            else:
+                print(row['code'], row.get('name', ''), row['trade_date'],
+                      ' '.join(f'{k}={v:.4g}' for k, v in row.items()
+                               if k not in ('code', 'name', 'trade_date') and v is not None))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f'命中 {count} 只，用时 {time.perf_counter() - started:.2f}s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
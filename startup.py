@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+from typing import Dict, List, Optional, Sequence
+
+# 启动相关工具：
+# - warmup(app, top_n)：在 worker 接受请求前加载路由按需导入的模块、解析表结构、编译模板并预取前 N 只股票的数据。
+#   app.py 在设置了 STOCK_WARMUP=N 时调用；也可以在 gunicorn 的 post_worker_init 等钩子里调用
+# - python startup.py importtime：用 python -X importtime 统计导入 app 的耗时，超过预算时返回非零，可用于 CI 检查
+
+# 路由在首次请求时导入的模块
+ROUTE_MODULES = ('db_utils', 'chart_payload', 'file_catalog', 'screener')
+DEFAULT_IMPORT_BUDGET_MS = 300
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def warmup(app, top_n: int = 0, codes: Optional[Sequence[str]] = None) -> Dict[str, float]:
+    """
+    预热：任何一步失败（例如数据库还不存在）只打印警告，不影响启动。
+    :param codes: 要预取的股票代码，默认取股票列表的前 top_n 只
+    :return: 各步骤耗时（秒）
+    """
+    timings: Dict[str, float] = {}
+
+    def step(name, func):
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            print(f'预热 {name} 失败: {e}', file=sys.stderr)
+        timings[name] = time.perf_counter() - started
+
+    def import_modules():
+        for module in ROUTE_MODULES:
+            importlib.import_module(module)
+
+    def compile_templates():
+        for name in app.jinja_env.list_templates():
+            if name.endswith('.html'):
+                app.jinja_env.get_template(name)
+
+    def prefetch():
+        from chart_payload import load_indicator_frame
+        from db_utils import get_data_version, get_stock_list, read_stock_data
+        selected = list(codes) if codes else [s['code'] for s in get_stock_list()[:top_n]]
+        for code in selected:
+            # 数据版本进入内存、列式缓存与预计算指标文件进入页缓存
+            get_data_version(code)
+            read_stock_data(code)
+            load_indicator_frame(code, 'day')
+
+    step('imports', import_modules)
+    step('templates', compile_templates)
+    step('schema', lambda: importlib.import_module('db_utils').preload_schema())
+    if top_n or codes:
+        step('prefetch', prefetch)
+    return timings
+
+
+def measure_import_time(module: str = 'app', cwd: Optional[str] = None) -> List[Dict[str, object]]:
+    """
+    在子进程中用 -X importtime 导入 module，返回每个被导入模块的 {'module', 'self_us', 'cumulative_us', 'depth'}，
+    最后一项是 module 本身（累计耗时即总导入时间）
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    env.pop('STOCK_WARMUP', None)   # 只统计导入本身
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd or root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'导入 {module} 失败:\n{result.stderr[-2000:]}')
+    rows = []
+    for line in result.stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            rows.append({'module': m.group(4), 'self_us': int(m.group(1)),
+                         'cumulative_us': int(m.group(2)), 'depth': len(m.group(3)) // 2})
+    return rows
+
+
+def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description='启动耗时检查与预热')
+    sub = parser.add_subparsers(dest='command', required=True)
+    check = sub.add_parser('importtime', help='统计导入耗时并与预算比较')
+    check.add_argument('module', nargs='?', default='app')
+    check.add_argument('--budget-ms', type=float, default=DEFAULT_IMPORT_BUDGET_MS, help='总导入耗时预算（毫秒）')
+    check.add_argument('--top', type=int, default=15, help='列出累计耗时最多的前 N 个顶层依赖')
+    check.add_argument('--cwd', default=None, help='在该目录下导入（数据库等相对路径以此为准）')
+    run = sub.add_parser('warmup', help='导入 app 并执行一次预热，打印各步骤耗时')
+    run.add_argument('--top-n', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == 'warmup':
+        os.environ.pop('STOCK_WARMUP', None)   # 由这里执行预热并计时
+        from app import app
+        for name, seconds in warmup(app, args.top_n).items():
+            print(f'{name:10s} {seconds * 1000:8.1f} ms')
+        return 0
+
+    rows = measure_import_time(args.module, args.cwd)
+    total_ms = rows[-1]['cumulative_us'] / 1000 if rows else 0.0
+    # 输出按后序排列：module 之前、上一个顶层导入之后深度为 1 的行就是 module 直接导入的依赖，
+    # 按累计耗时排序即各依赖分摊的启动成本
+    direct = []
+    for r in reversed(rows[:-1]):
+        if r['depth'] == 0:
+            break
+        if r['depth'] == 1:
+            direct.append(r)
+    direct.sort(key=lambda r: r['cumulative_us'], reverse=True)
+    for r in direct[:args.top]:
+        print(f"{r['cumulative_us'] / 1000:8.1f} ms  {r['module']}")
+    within = total_ms <= args.budget_ms
+    print(f"导入 {args.module} 共 {total_ms:.1f} ms，预算 {args.budget_ms:.0f} ms，{'通过' if within else '超出预算'}")
+    return 0 if within else 1
+
+
+if __name__ == '__main__':
+    sys.exit(_main(sys.argv[1:]))
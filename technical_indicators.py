@@ -1,5 +1,38 @@
 import pandas as pd
 import numpy as np
+from resample import resample_ohlcv
+from file_catalog import load_frame
+
+# 指标预热所需的K线数：最长滚动窗口为 MA60，EMA 类指标（MACD/KDJ）在 120 根之后初值的影响可以忽略
+INDICATOR_WARMUP_BARS = 120
+# 交易日换算为自然日的放大系数（一年约 245 个交易日）
+CALENDAR_DAYS_PER_BAR = 1.5
+# 各周期一根K线大约包含的交易日数
+TRADING_DAYS_PER_BAR = {'day': 1, 'week': 5, 'month': 22, 'quarter': 66, 'year': 250}
+# 预热读取的最早日期
+EARLIEST_FETCH_DATE = pd.Timestamp('1900-01-01')
+
+
+def trading_days_per_bar(period='day'):
+    """
+    周期内的交易日数；'Nd' 形式的周期即 N
+    """
+    if period in TRADING_DAYS_PER_BAR:
+        return TRADING_DAYS_PER_BAR[period]
+    return int(period[:-1])
+
+
+def warmup_start(start, bars=INDICATOR_WARMUP_BARS, period='day'):
+    """
+    返回为保证 start 当天 period 周期指标有效而需要提前读取的起始日期，不早于 EARLIEST_FETCH_DATE
+    """
+    start = pd.Timestamp(start)
+    days = int(bars * trading_days_per_bar(period) * CALENDAR_DAYS_PER_BAR)
+    # 长周期指标叠加较大的 N 日K时预热可达上千年，在构造 Timedelta 之前截断，避免日期越界
+    limit = (start - EARLIEST_FETCH_DATE).days
+    if 0 < limit <= days:
+        return EARLIEST_FETCH_DATE
+    return start - pd.Timedelta(days=days)
 
 def calculate_rsi(prices, period=14):
     """
@@ -150,69 +183,132 @@ def process_stock_data_with_indicators(stock_data):
     
     return data
 
+def _pack_columns(arrays):
+    # 每列把有K线的行（任一输入非 NaN）按原顺序挤到顶部，缺失行放到底部并置为 NaN
+    valid = np.zeros(arrays[0].shape, dtype=bool)
+    for values in arrays:
+        valid |= ~np.isnan(values)
+    order = np.argsort(~valid, axis=0, kind='stable')
+    filled = np.arange(valid.shape[0])[:, None] < valid.sum(axis=0)
+    packed = []
+    for values in arrays:
+        p = np.take_along_axis(values, order, axis=0)
+        p[~filled] = np.nan
+        packed.append(p)
+    return packed, order, valid
+
+def _unpack_column(values, order, valid):
+    out = np.empty_like(values)
+    np.put_along_axis(out, order, values, axis=0)
+    out[~valid] = np.nan
+    return out
+
+def _apply_matrix(func, *arrays, **kwargs):
+    """
+    二维（日期 × 股票）版本的通用实现：每列跳过缺失的交易日后，把整个矩阵包成 DataFrame
+    交给 Series 版本的指标函数（rolling/ewm 在 DataFrame 上逐列计算），结果再放回原来的行。
+    每列的预热期从该股票自己的第一根K线算起，停牌缺失的日期不打断滚动窗口，
+    结果与对单只股票调用 Series 版本逐位一致。
+    """
+    arrays = [np.asarray(a, dtype=np.float64) for a in arrays]
+    packed, order, valid = _pack_columns(arrays)
+    result = func(*[pd.DataFrame(p, copy=False) for p in packed], **kwargs)
+    if isinstance(result, dict):
+        return {k: _unpack_column(v.to_numpy(dtype=np.float64), order, valid) for k, v in result.items()}
+    return _unpack_column(result.to_numpy(dtype=np.float64), order, valid)
+
+def calculate_rsi_matrix(prices, period=14):
+    """
+    RSI 的矩阵版本
+    :param prices: 收盘价二维数组 (日期 × 股票)，缺失为 NaN
+    :return: 同形状的 RSI 数组
+    """
+    return _apply_matrix(calculate_rsi, prices, period=period)
+
+def calculate_macd_matrix(prices, fast_period=12, slow_period=26, signal_period=9):
+    """
+    MACD 的矩阵版本，返回 {'MACD', 'Signal', 'Histogram'} -> 二维数组
+    """
+    return _apply_matrix(calculate_macd, prices, fast_period=fast_period,
+                         slow_period=slow_period, signal_period=signal_period)
+
+def calculate_bollinger_bands_matrix(prices, period=20, std_dev=2):
+    """
+    布林带的矩阵版本，返回 {'Upper', 'Middle', 'Lower'} -> 二维数组
+    """
+    return _apply_matrix(calculate_bollinger_bands, prices, period=period, std_dev=std_dev)
+
+def calculate_kdj_matrix(high, low, close, period=9, k_period=3, d_period=3):
+    """
+    KDJ 的矩阵版本，返回 {'K', 'D', 'J'} -> 二维数组
+    """
+    return _apply_matrix(calculate_kdj, high, low, close, period=period,
+                         k_period=k_period, d_period=d_period)
+
+def calculate_moving_averages_matrix(prices):
+    """
+    移动平均线的矩阵版本，返回 {'MA5', ..., 'MA60'} -> 二维数组
+    """
+    return _apply_matrix(calculate_moving_averages, prices)
+
+def calculate_indicators_matrix(high, low, close):
+    """
+    一次算出全部股票的全部指标（列名同 process_stock_data_with_indicators）
+    :param high/low/close: 二维数组 (日期 × 股票)，例如 db_utils.read_stock_panel 的 data 字段
+    :return: 指标名 -> 二维数组
+    """
+    def all_indicators(high, low, close):
+        result = dict(calculate_moving_averages(close))
+        result['RSI'] = calculate_rsi(close)
+        macd = calculate_macd(close)
+        result['MACD'] = macd['MACD']
+        result['MACD_Signal'] = macd['Signal']
+        result['MACD_Histogram'] = macd['Histogram']
+        bb = calculate_bollinger_bands(close)
+        result['BB_Upper'] = bb['Upper']
+        result['BB_Middle'] = bb['Middle']
+        result['BB_Lower'] = bb['Lower']
+        kdj = calculate_kdj(high, low, close)
+        result['KDJ_K'] = kdj['K']
+        result['KDJ_D'] = kdj['D']
+        result['KDJ_J'] = kdj['J']
+        return result
+
+    # 三个输入一起挤压，保证同一股票的各指标使用同一组交易日
+    return _apply_matrix(all_indicators, high, low, close)
+
+def _resample_with_volume(stock_data, period):
+    # 没有成交量列时保持原有行为：合成后的成交量为 0
+    bars = resample_ohlcv(stock_data, period)
+    if 'vol' not in bars.columns:
+        bars['vol'] = 0
+    return bars
+
 def process_weekly_data_with_volume(stock_data):
     """
     处理周K数据（包含成交量处理）
     """
-    stock_data['date'] = pd.to_datetime(stock_data['trade_date'])
-    stock_data['week'] = stock_data['date'].dt.isocalendar().week
-    stock_data['year'] = stock_data['date'].dt.isocalendar().year
-    
-    # 按年和周分组，计算周K数据
-    weekly_data = stock_data.groupby(['year', 'week']).agg({
-        'open': 'first',
-        'high': 'max',
-        'low': 'min',
-        'close': 'last',
-        'trade_date': 'last',
-        'vol': 'sum' if 'vol' in stock_data.columns else lambda x: 0  # 成交量求和
-    }).reset_index()
-    
-    return weekly_data
+    return _resample_with_volume(stock_data, 'week')
 
 def process_monthly_data_with_volume(stock_data):
     """
     处理月K数据（包含成交量处理）
     """
-    stock_data['date'] = pd.to_datetime(stock_data['trade_date'])
-    stock_data['month'] = stock_data['date'].dt.month
-    stock_data['year'] = stock_data['date'].dt.year
-    
-    # 按年和月分组，计算月K数据
-    monthly_data = stock_data.groupby(['year', 'month']).agg({
-        'open': 'first',
-        'high': 'max',
-        'low': 'min',
-        'close': 'last',
-        'trade_date': 'last',
-        'vol': 'sum' if 'vol' in stock_data.columns else lambda x: 0  # 成交量求和
-    }).reset_index()
-    
-    return monthly_data
+    return _resample_with_volume(stock_data, 'month')
 
 def process_yearly_data_with_volume(stock_data):
     """
     处理年K数据（包含成交量处理）
     """
-    stock_data['date'] = pd.to_datetime(stock_data['trade_date'])
-    stock_data['year'] = stock_data['date'].dt.year
-    
-    # 按年分组，计算年K数据
-    yearly_data = stock_data.groupby('year').agg({
-        'open': 'first',
-        'high': 'max',
-        'low': 'min',
-        'close': 'last',
-        'trade_date': 'last',
-        'vol': 'sum' if 'vol' in stock_data.columns else lambda x: 0  # 成交量求和
-    }).reset_index()
-    
-    return yearly_data
+    return _resample_with_volume(stock_data, 'year')
 
 def read_stock_data_enhanced(file_path):
     """
-    增强版股票数据读取函数
+    增强版股票数据读取函数（文件未修改时复用已解析的结果）
     """
+    return load_frame(file_path, _parse_stock_file)
+
+def _parse_stock_file(file_path):
     df = pd.read_excel(file_path)
     # 确保日期格式正确
     df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
@@ -0,0 +1,58 @@
+import os
+import sys
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_bars(start='2023-01-02', periods=300, seed=0):
+    """工作日上的随机游走日K：DataFrame(trade_date(datetime64), open, high, low, close, vol)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=periods)
+    close = np.round(20 * np.exp(np.cumsum(rng.normal(0, 0.02, periods))), 2)
+    open_ = np.round(np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.005, periods)), 2)
+    return pd.DataFrame({
+        'trade_date': dates,
+        'open': open_,
+        'high': np.maximum(open_, close) + 0.1,
+        'low': np.minimum(open_, close) - 0.1,
+        'close': close,
+        'vol': rng.integers(1000, 5000, periods).astype(float),
+    })
+
+
+def write_bars(code, bars, name=None, db_path=os.path.join('stock-data', 'stock_data.db')):
+    """把日K写入当前目录下的价格库（stock_daily，yyyymmdd 文本日期），已有的同代码数据先删除"""
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS stock_daily (ts_code TEXT, name TEXT, trade_date TEXT, '
+                         'open REAL, high REAL, low REAL, close REAL, vol REAL)')
+            conn.execute('DELETE FROM stock_daily WHERE ts_code = ?', [code])
+            conn.executemany('INSERT INTO stock_daily VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+                (code, name or code, d.strftime('%Y%m%d'), o, h, l, c, v)
+                for d, o, h, l, c, v in zip(pd.DatetimeIndex(bars['trade_date']), bars['open'], bars['high'],
+                                            bars['low'], bars['close'], bars['vol'])])
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def stock_db(tmp_path, monkeypatch):
+    """在临时目录中运行（数据库与各级缓存都是相对路径），写入一只股票 000001.SZ，返回其日K"""
+    monkeypatch.chdir(tmp_path)
+    import db_utils
+    import payload_cache
+    bars = make_bars()
+    write_bars('000001.SZ', bars)
+    db_utils.invalidate_schema_cache()
+    db_utils.close_thread_connection()
+    db_utils._version_memo.clear()
+    payload_cache.invalidate()
+    yield bars
+    db_utils.close_thread_connection()
@@ -0,0 +1,50 @@
+import pytest
+
+
+@pytest.fixture
+def client(stock_db):
+    from app import app
+    app.testing = True
+    return app.test_client()
+
+
+@pytest.mark.parametrize('query', [
+    'start=garbage',
+    'end=2024-13-40',
+    'start=2024-01-01T10:00:00%2B08:00',
+    'start=1600-01-01',
+    'start=99999-01-01',
+    'start=2024-01-10&end=2024-01-01',
+    'last_n=-5',
+    'last_n=0',
+    'last_n=99999999999999999999',
+    'points=abc',
+    'points=²',
+    'period=99999999999999d&start=2024-01-01&indicators=ma5',
+    'period=99999999999999999999d&last_n=5',
+    'period=251d',
+    'indicators=ma99999999&start=2024-01-01',
+])
+def test_invalid_parameters_return_400(client, query):
+    response = client.get(f'/api/kline/000001.SZ?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_unknown_code_returns_404(client):
+    assert client.get('/api/kline/999999.SZ').status_code == 404
+
+
+@pytest.mark.parametrize('query', ['start=2030-01-01', 'end=2000-01-01', 'start=2030-01-01&indicators=all&period=week'])
+def test_empty_window_returns_empty_arrays(client, query):
+    response = client.get(f'/api/kline/000001.SZ?{query}')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['dates'] == [] and body['values'] == []
+    assert all(values == [] for values in body.get('indicators', {}).values())
+
+
+def test_long_n_day_period_with_long_warmup(client):
+    response = client.get('/api/kline/000001.SZ?period=250d&start=2023-06-01&indicators=all')
+    assert response.status_code == 200
+    assert len(response.get_json()['dates']) >= 1
@@ -0,0 +1,21 @@
+import pytest
+
+from chart_payload import build_kline_payload
+
+
+@pytest.mark.parametrize('period, start', [('month', '2023-03-20'), ('week', '2023-03-22'),
+                                           ('quarter', '2023-05-10'), ('5d', '2023-03-22')])
+def test_mid_period_start_returns_complete_first_bar(stock_db, period, start):
+    full = build_kline_payload('000001.SZ', period)
+    window = build_kline_payload('000001.SZ', period, start=start, end='2023-09-29')
+    first_date = window['dates'][0]
+    # 窗口内第一根K线与不限窗口时同一根K线完全一致（开盘价来自该周期的第一个交易日）
+    assert window['values'][0] == full['values'][full['dates'].index(first_date)]
+
+
+def test_first_bar_does_not_depend_on_requested_indicators(stock_db):
+    params = dict(period='month', start='2023-03-20', end='2023-09-29')
+    plain = build_kline_payload('000001.SZ', **params)
+    with_ma = build_kline_payload('000001.SZ', indicators=['ma5'], **params)
+    with_macd = build_kline_payload('000001.SZ', indicators=['macd'], **params)
+    assert plain['values'] == with_ma['values'] == with_macd['values']
@@ -0,0 +1,56 @@
+import sqlite3
+
+import numpy as np
+
+import column_cache
+import db_utils
+from conftest import write_bars
+
+
+def _rewrite_same_range(bars, close_offset):
+    # 模拟 ingest 重新导入修正过的文件：行数和最大日期不变，只改价格，并递增写入计数
+    corrected = bars.assign(close=bars['close'] + close_offset)
+    write_bars('000001.SZ', corrected)
+    conn = sqlite3.connect(db_utils.DB_PATH)
+    with conn:
+        db_utils.bump_data_revision(conn, '000001.SZ')
+    conn.close()
+    return corrected
+
+
+def test_panel_sees_rewritten_data_after_cache_built_without_revision(stock_db):
+    assert column_cache.ENABLED
+    db_utils.read_stock_data('000001.SZ')   # 在还没有写入计数时建立列式缓存
+    assert 'revision' not in column_cache.stored_version('000001.SZ')
+    corrected = _rewrite_same_range(stock_db, 1000)
+
+    assert db_utils.get_data_version('000001.SZ')['revision'] == 1
+    panel = db_utils.read_stock_panel(['000001.SZ'])
+    np.testing.assert_allclose(panel.data['close'][:, 0], corrected['close'])
+    np.testing.assert_allclose(db_utils.read_stock_data('000001.SZ')['close'], corrected['close'])
+
+
+def test_panel_hits_cache_written_with_revision(stock_db, monkeypatch):
+    corrected = _rewrite_same_range(stock_db, 0.5)
+    db_utils.read_stock_data('000001.SZ')   # 带写入计数的版本建立缓存
+
+    def no_sql(*args, **kwargs):
+        raise AssertionError('版本一致时批量读取应命中列式缓存')
+    monkeypatch.setattr(db_utils.pd, 'read_sql_query', no_sql)
+    panel = db_utils.read_stock_panel(['000001.SZ'])
+    np.testing.assert_allclose(panel.data['close'][:, 0], corrected['close'])
+
+
+def test_cache_hit_result_is_writable(stock_db):
+    first = db_utils.read_stock_data('000001.SZ')    # SQL 读取并建立缓存
+    cached = db_utils.read_stock_data('000001.SZ')   # 命中列式缓存
+    assert column_cache.stored_version('000001.SZ') is not None
+    for frame in (first, cached):
+        frame.loc[0, 'close'] = 1.0
+        frame['close'] *= 2
+        assert frame.loc[0, 'close'] == 2.0
+    # 调用方的修改不会写回缓存
+    again = db_utils.read_stock_data('000001.SZ')
+    assert again.loc[0, 'close'] == stock_db.loc[0, 'close']
+    sliced = db_utils.read_stock_data('000001.SZ', start='2023-03-01', last_n=5)
+    sliced.loc[sliced.index[0], 'open'] = 0.0
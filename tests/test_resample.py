@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from resample import resample_ohlcv
+from conftest import make_bars
+
+
+def test_n_day_bars_do_not_depend_on_window_start():
+    bars = make_bars(periods=120)
+    full = resample_ohlcv(bars, '5d')
+    for offset in (1, 2, 3, 7):
+        window = resample_ohlcv(bars.iloc[offset:].reset_index(drop=True), '5d')
+        # 除了被窗口截断的第一根，其余K线与完整序列的合成结果一致
+        tail = full[full['trade_date'] > window['trade_date'].iloc[0]].reset_index(drop=True)
+        pd.testing.assert_frame_equal(window.iloc[1:].reset_index(drop=True), tail)
+
+
+def test_n_day_bars_group_n_weekdays():
+    bars = make_bars(start='2024-01-01', periods=40)   # 连续工作日，没有缺口
+    result = resample_ohlcv(bars, '5d')
+    ends = np.searchsorted(bars['trade_date'].to_numpy(), result['trade_date'].to_numpy(), side='right')
+    sizes = np.diff(np.concatenate(([0], ends)))
+    # 首尾两根可能被数据范围截断，中间每根正好 5 个交易日
+    assert (sizes[1:-1] == 5).all()
+    assert sizes.sum() == len(bars)
+    assert result['vol'].sum() == bars['vol'].sum()
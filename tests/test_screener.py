@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+import screener
+from screener import Expression
+
+
+@pytest.mark.parametrize('source', [
+    '-' * 1999 + '1',
+    'not ' * 400 + 'close',
+    'x' * 3000,
+    'ref(close, 99999999999999) > 0',
+    'ref(ref(ref(close, 100), 100), 100) > 0',
+    'ref(close, True) > 0',
+    'close > 0\x00',
+])
+def test_hostile_expressions_raise_value_error(source):
+    with pytest.raises(ValueError):
+        Expression(source)
+
+
+def test_lookback_within_limit():
+    assert Expression('ref(close, 250) > 0').lookback == 250
+
+
+def test_screen_route_rejects_deep_expression(stock_db):
+    from app import app
+    response = app.test_client().get('/screen', query_string={'expr': '-' * 1999 + '1'})
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def fresh_pool(monkeypatch):
+    # 本机可能只有一个核，固定为 2 个进程以走进程池
+    monkeypatch.setattr(screener.os, 'cpu_count', lambda: 2)
+    screener._pool = None
+    yield
+    if screener._pool is not None:
+        screener._pool.shutdown(wait=True)
+        screener._pool = None
+
+
+def test_screen_recovers_from_broken_pool(stock_db, fresh_pool):
+    assert [r['code'] for r in screener.screen('close > 0', ['000001.SZ'])] == ['000001.SZ']
+    pool = screener._pool
+    for process in list(pool._processes.values()):
+        process.kill()
+        process.join()
+    deadline = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert [r['code'] for r in screener.screen('close > 0', ['000001.SZ'])] == ['000001.SZ']
+    assert screener._pool is not pool